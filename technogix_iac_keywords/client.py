@@ -0,0 +1,57 @@
+""" -----------------------------------------------------
+# TECHNOGIX
+# -------------------------------------------------------
+# Copyright (c) [2022] Technogix SARL
+# All rights reserved
+# -------------------------------------------------------
+# Keywords to configure aws clients shared by all keywords
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @18 october 2026
+# Latest revision: 18 october 2026
+# --------------------------------------------------- """
+
+# System includes
+from sys import path as syspath
+from os import path
+
+# Robotframework includes
+from robot.api import logger
+from robot.api.deco import keyword
+ROBOT = False
+
+# Local includes
+# Tools import the tool module from their own directory : it shall be imported the same
+# way here, so that keywords configure the very objects the tools are using
+syspath.append(path.normpath(path.join(path.dirname(__file__), './tools')))
+from tool import CLIENT_POOL, REGION_TABLE
+
+@keyword("Configure AWS Regions Cache")
+def configure_aws_regions_cache(filename) :
+    """ Persist the services regions availability table in a file, so that it is only
+        computed once across test runs
+        ---
+        filename (str) : Json file in which the table shall be stored
+    """
+    REGION_TABLE.configure(filename)
+    logger.info("Regions cache configured")
+
+# pylint: disable=R0913
+@keyword("Configure AWS Client Performance")
+def configure_aws_client_performance(max_pool_connections = 50, retry_mode = 'adaptive', \
+    max_attempts = 10, connect_timeout = 10, read_timeout = 60, tcp_keepalive = None) :
+    """ Set the connection pool, retry and timeout profile of all the aws clients
+        Shall be called before the keywords using the clients
+        ---
+        max_pool_connections (str) : Maximal number of connections kept in a client pool
+        retry_mode           (str) : Botocore retry mode (legacy, standard or adaptive)
+        max_attempts         (str) : Maximal number of attempts for a request
+        connect_timeout      (str) : Connection timeout in seconds
+        read_timeout         (str) : Read timeout in seconds
+        tcp_keepalive        (str) : True to enable tcp keepalive, botocore default if None
+    """
+    keepalive = None
+    if tcp_keepalive is not None : keepalive = (str(tcp_keepalive).lower() == 'true')
+    CLIENT_POOL.configure(int(max_pool_connections), retry_mode, int(max_attempts), \
+        float(connect_timeout), float(read_timeout), keepalive)
+    logger.info("Client performance configured")
+# pylint: enable=R0913
@@ -82,9 +82,8 @@ def no_repository_in_regions(regions, access_key, secret_key) :
         access_key (str)  : Access key for IAM users authentication in aws
         secret_key (str)  : Secret key associated to the previous access key
     """
-    local_tools = CodecommitTools()
-    for region in regions :
-        local_tools.initialize(None, access_key, secret_key, region = region)
-        repos = local_tools.list_repositories()
+    result = CodecommitTools.scan_regions(regions, CodecommitTools.list_repositories, \
+        access_key = access_key, secret_key = secret_key)
+    for region, repos in result.items() :
         if len(repos) != 0 : raise Exception('Found codecommit repository ' + dumps(repos[0]) + \
             ' in region ' + region)
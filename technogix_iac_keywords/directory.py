@@ -66,9 +66,8 @@ def no_directory_in_regions(regions, access_key, secret_key) :
         access_key (str)  : Access key for IAM users authentication in aws
         secret_key (str)  : Secret key associated to the previous access key
     """
-    local_tools = DirectoryTools()
-    for region in regions :
-        local_tools.initialize(None, access_key, secret_key, region = region)
-        directories = local_tools.list_directories()
+    result = DirectoryTools.scan_regions(regions, DirectoryTools.list_directories, \
+        access_key = access_key, secret_key = secret_key)
+    for region, directories in result.items() :
         if len(directories) != 0 : raise Exception('Found key ' + dumps(directories[0]) + \
             ' in region ' + region)
@@ -78,10 +78,9 @@ def no_vpc_in_regions(regions, access_key, secret_key) :
         access_key (str)  : Access key for IAM users authentication in aws
         secret_key (str)  : Secret key associated to the previous access key
     """
-    local_tools = EC2Tools()
-    for region in regions :
-        local_tools.initialize(None, access_key, secret_key, region = region)
-        vpcs = local_tools.list_vpcs()
+    result = EC2Tools.scan_regions(regions, EC2Tools.list_vpcs, access_key = access_key, \
+        secret_key = secret_key)
+    for region, vpcs in result.items() :
         if len(vpcs) != 0 : raise Exception('Found vpc ' + dumps(vpcs[0]) + \
             ' in region ' + region)
 
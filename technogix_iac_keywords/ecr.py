@@ -59,3 +59,12 @@ def repositories_shall_exist_and_match(specs) :
                 logger.info('Repository ' + spec['name'] + \
                     ' matches repository ' + repository['repositoryName'])
         if not found : raise Exception('Repository ' + spec['name'] + ' does not match')
+
+@keyword('Repositories Shall Not Be Public')
+def repositories_shall_not_be_public() :
+    """ Check that no repository policy allows everyone to perform an action """
+    result = ECR_TOOLS.list_repositories()
+    for repository in result :
+        if ECR_TOOLS.is_repository_public(repository) :
+            raise Exception('Repository ' + repository['repositoryName'] + \
+                ' policy allows public access')
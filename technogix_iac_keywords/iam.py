@@ -13,7 +13,7 @@
 # System includes
 from sys import path as syspath
 from os import path
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from json import dumps
 
 # Robotframework includes
@@ -42,6 +42,26 @@ def intialize_iam(profile = None, access_key = None, secret_key = None, region =
     IAM_TOOLS.initialize(profile, access_key, secret_key, region)
     logger.info("Initialization performed")
 
+@keyword("Configure Credential Report Cache")
+def configure_credential_report_cache(ttl = 14400, timeout = 300) :
+    """ Set the delay during which the credential report is reused by the iam keywords
+        ---
+        ttl     (str) : Delay in seconds during which a retrieved report is reused
+        timeout (str) : Maximal delay in seconds to wait for a report generation
+    """
+    IAM_TOOLS.configure_credential_report(int(ttl), int(timeout))
+    logger.info("Credential report cache configured")
+
+@keyword("Configure Policy Documents Cache")
+def configure_policy_documents_cache(directory) :
+    """ Persist the policy documents in a directory, so that unchanged aws managed policies
+        are only downloaded once across test runs
+        ---
+        directory (str) : Directory in which the documents shall be stored
+    """
+    IAM_TOOLS.configure_policy_cache(directory)
+    logger.info("Policy documents cache configured")
+
 @keyword("Add New User")
 def add_new_user(username) :
     """ Add new user to IAM
@@ -67,6 +87,31 @@ def remove_user(username) :
     """
     IAM_TOOLS.remove_user(username)
 
+@keyword("Create IAM Users")
+def create_iam_users(usernames, groups = None, max_workers = 5) :
+    """ Create users concurrently in IAM, with an access key and group memberships
+        If a user can not be created, all the users created are removed
+        ---
+        usernames   (list) : Usernames to add
+        groups      (list) : Groups to add users to (default = None)
+        max_workers (str)  : Maximal number of users created concurrently
+        ---
+        returns     (dict) : Users access and secret keys, indexed by username
+    """
+    result = IAM_TOOLS.create_users(usernames, groups, int(max_workers))
+    logger.info(str(len(result)) + ' users created')
+    return result
+
+@keyword("Remove IAM Users")
+def remove_iam_users(usernames, max_workers = 5) :
+    """ Remove users concurrently from IAM, with their access keys and group memberships
+        ---
+        usernames   (list) : Usernames to remove
+        max_workers (str)  : Maximal number of users removed concurrently
+    """
+    IAM_TOOLS.remove_users(usernames, int(max_workers))
+    logger.info(str(len(usernames)) + ' users removed')
+
 @keyword("Remove User From Group")
 def remove_user_from_group( username, group) :
     """ Remove user from IAM group
@@ -185,11 +230,13 @@ def access_keys_number_less_than(max_number) :
         ---
         max_number (str) : Maximal allowed number of access keys
     """
-    result = IAM_TOOLS.list_users()
-    for user in result :
-        keys = IAM_TOOLS.list_user_access_keys(user['UserName'])
-        if len(keys) > int(max_number) :
-            raise Exception(str(len(keys)) + ' keys found for user ' + user['UserName'])
+    result = IAM_TOOLS.get_credential_report()
+    numbers = {}
+    for key in result.list_active_access_keys() :
+        numbers[key['user']] = numbers.get(key['user'], 0) + 1
+    for user, number in numbers.items() :
+        if number > int(max_number) :
+            raise Exception(str(number) + ' keys found for user ' + user)
 
 @keyword("No Service Credentials")
 def no_service_credentials() :
@@ -207,117 +254,65 @@ def root_shall_not_have_been_used_since( minimal_age) :
         ---
         minimal_age (str) : Maximal delay since root user has not been used
     """
-    result = IAM_TOOLS.parse_credential_report()
-
-    for i_row in range(1,len(result['content'])) :
-        if result['content'][i_row][result['columns']['user']] == '<root_account>' :
-
-            dates = {}
-            ages = []
-            password_used = result['content'][i_row][result['columns']['password_last_used']]
-            key1_used = result['content'][i_row][result['columns']['access_key_1_last_used_date']]
-            key2_used = result['content'][i_row][result['columns']['access_key_2_last_used_date']]
-
-            if not password_used == 'N/A' :
-                dates['password_last_used'] = datetime.fromisoformat(password_used)
-            if not key1_used == 'N/A' :
-                dates['key_1_last_used_date'] = datetime.fromisoformat(key1_used)
-            if not key2_used == 'N/A' :
-                dates['key_2_last_used_date'] = datetime.fromisoformat(key2_used)
-
-            if 'password_last_used' in dates :
-                ages.append((datetime.now(timezone.utc) - dates['password_last_used']).days)
-            if 'key_1_last_used_date' in dates :
-                ages.append((datetime.now(timezone.utc) - dates['key_1_last_used_date']).days)
-            if 'key_2_last_used_date' in dates :
-                ages.append((datetime.now(timezone.utc) - dates['key_2_last_used_date']).days)
-
-            min_age = min(ages)
+    result = IAM_TOOLS.get_credential_report()
+    root = result.row('<root_account>')
+    if root is not None :
+        dates = [root['password_last_used'], root['access_key_1_last_used_date'], \
+            root['access_key_2_last_used_date']]
+        dates = [date for date in dates if date is not None]
+        if len(dates) > 0 :
+            min_age = (datetime.now(timezone.utc) - max(dates)).days
             if min_age < int(minimal_age) :
                 raise Exception('Root user used ' + str(min_age) + ' days ago')
 
 @keyword("Console Users Shall Have MFA Enabled")
 def user_mfa_enabled() :
     """ Check that all users have MFA activated """
-    result = IAM_TOOLS.parse_credential_report()
-    for i_row in range(1,len(result['content'])) :
-        if result['content'][i_row][result['columns']['password_enabled']] == 'true' and \
-            result['content'][i_row][result['columns']['mfa_active']] == 'false' :
-            name = result['content'][i_row][result['columns']['user']]
+    result = IAM_TOOLS.get_credential_report()
+    for name, password, mfa in zip(result.column('user'), result.column('password_enabled'), \
+        result.column('mfa_active')) :
+        if password and not mfa :
             raise Exception('User ' + name + ' has console password but no MFA enabled' )
 
 @keyword("Users Access Key Shall Not Be Created At User Creation Step")
 def access_key_creation_date() :
     """ Check that users access keys creation date is not user creation date """
-    result = IAM_TOOLS.list_users()
-    for user in result :
-        user_creation_date = user['CreateDate']
-        keys = IAM_TOOLS.list_user_access_keys(user['UserName'])
-        for key in keys :
-            delta = abs((user_creation_date - key['CreateDate']).total_seconds())
+    result = IAM_TOOLS.get_credential_report()
+    for key in result.list_active_access_keys() :
+        if key['user_creation_time'] is not None and key['last_rotated'] is not None :
+            delta = abs((key['user_creation_time'] - key['last_rotated']).total_seconds())
             if delta < 60 :
-                name = user['UserName']
-                raise Exception('User ' + name + ' access key has been created on user creation')
+                raise Exception('User ' + key['user'] + \
+                    ' access key has been created on user creation')
 
-# pylint: disable=R0912
 @keyword("Credentials Unused For Too Long Shall Be disabled")
 def credentials_unused_disabled(delay) :
     """ Check that credentials unused since more than a given delay are disabled
         ---
         delay (str) : Maximal delay since credentials have been unused
     """
-    result = IAM_TOOLS.parse_credential_report()
-    for i_row in range(1,len(result['content'])) :
-
-        user = result['content'][i_row][result['columns']['user']]
-        pass_enabled = result['content'][i_row][result['columns']['password_enabled']]
-        pass_last_used = result['content'][i_row][result['columns']['password_last_used']]
-        pass_last_changed = result['content'][i_row][result['columns']['password_last_used']]
-
-        key1_enabled = result['content'][i_row][result['columns']['access_key_1_active']]
-        key1_last_used = result['content'][i_row][result['columns']['access_key_1_last_used_date']]
-        key1_last_changed = result['content'][i_row][result['columns']['access_key_1_last_rotated']]
-
-        key2_enabled = result['content'][i_row][result['columns']['access_key_2_active']]
-        key2_last_used = result['content'][i_row][result['columns']['access_key_2_last_used_date']]
-        key2_last_changed = result['content'][i_row][result['columns']['access_key_2_last_rotated']]
-
-        if pass_enabled == 'true' :
-            if not pass_last_used == "N/A" :
-                days = (datetime.now(timezone.utc) - datetime.fromisoformat(pass_last_used)).days
-                if days >= int(delay) :
-                    raise Exception('User ' + user + ' password has been unused for ' + \
-                        str(days) + ' days')
-            else :
-                days = (datetime.now(timezone.utc) - datetime.fromisoformat(pass_last_changed)).days
-                if days >= int(delay) :
-                    raise Exception('User ' + user + ' password has been unchanged for ' + \
-                        str(days) + ' days')
-
-        if key1_enabled == 'true' :
-            if not key1_last_used == 'N/A' :
-                days = (datetime.now(timezone.utc) - datetime.fromisoformat(key1_last_used)).days
-                if days >= int(delay) :
-                    raise Exception('User ' + user + ' access key has been unused for ' + \
-                        str(days) + ' days')
-            else :
-                days = (datetime.now(timezone.utc) - datetime.fromisoformat(key1_last_changed)).days
-                if days >= int(delay) :
-                    raise Exception('User ' + user + ' access key has been unchanged for ' + \
-                        str(days) + ' days')
-
-        if key2_enabled == 'true' :
-            if not key2_last_used == 'N/A' :
-                days = (datetime.now(timezone.utc) - datetime.fromisoformat(key2_last_used)).days
-                if days >= int(delay) :
-                    raise Exception('User ' + user + ' access key has been unused for ' + \
-                        str(days) + ' days')
-            else :
-                days = (datetime.now(timezone.utc) - datetime.fromisoformat(key2_last_changed)).days
-                if days >= int(delay) :
-                    raise Exception('User ' + user + ' access key has been unchanged for ' + \
-                        str(days) + ' days')
-# pylint: enable=R0912
+    result = IAM_TOOLS.get_credential_report()
+    limit = datetime.now(timezone.utc) - timedelta(days = int(delay))
+
+    # Credentials never used are analyzed from their last change
+    credentials = [
+        ('password', 'password_enabled', 'password_last_used', 'password_last_changed'),
+        ('access key', 'access_key_1_active', 'access_key_1_last_used_date', \
+            'access_key_1_last_rotated'),
+        ('access key', 'access_key_2_active', 'access_key_2_last_used_date', \
+            'access_key_2_last_rotated')
+    ]
+
+    users = result.column('user')
+    for name, enabled, last_used, last_changed in credentials :
+        for user, is_enabled, used, changed in zip(users, result.column(enabled), \
+            result.column(last_used), result.column(last_changed)) :
+            if is_enabled and used is not None and used <= limit :
+                raise Exception('User ' + user + ' ' + name + ' has been unused for ' + \
+                    str((datetime.now(timezone.utc) - used).days) + ' days')
+            if is_enabled and used is None and changed is not None and changed <= limit :
+                raise Exception('User ' + user + ' ' + name + ' has been unchanged for ' + \
+                    str((datetime.now(timezone.utc) - changed).days) + ' days')
 
 @keyword("Users Access Key Shall Not Be Older Than")
 def access_key_younger(delay) :
@@ -338,9 +333,10 @@ def access_key_younger(delay) :
 @keyword("No Permissions Shall Be Attributed To User Directly")
 def user_has_no_permission() :
     """ Check that users have no direct permissions """
-    result = IAM_TOOLS.list_users()
+    snapshot = IAM_TOOLS.take_snapshot(['User'])
+    result = snapshot.list_users()
     for user in result :
-        has_permission = IAM_TOOLS.has_permission(user['UserName'])
+        has_permission = IAM_TOOLS.has_permission(user['UserName'], snapshot)
         if has_permission : raise Exception('User ' + user['UserName'] + ' has a direct policy')
 
 @keyword("Policy Shall Have Been Attached To A Role")
@@ -349,17 +345,11 @@ def policy_shall_have_been_attached_to_a_role(name) :
         ---
         name (str) : Policy name
     """
-    result = IAM_TOOLS.list_attached_policies()
-    found = False
-    for policy in result :
-        if policy['PolicyName'] == name :
-            roles = IAM_TOOLS.list_roles_for_policy(policy)
-            if len(roles) > 0 :
-                found = True
-                logger.info('Policy ' + policy['PolicyName'] + ' gives ' + name + \
-                    ' access to entities ' + ','.join([role['RoleName'] for role in roles]))
-    if not found :
+    roles = IAM_TOOLS.list_roles_for_policy_name(name)
+    if len(roles) == 0 :
         raise Exception("No role found for policy " + name)
+    logger.info('Policy ' + name + ' gives access to entities ' + \
+        ','.join([role['RoleName'] for role in roles]))
 
 @keyword("Certificates Shall Not Expire In Less Than")
 def certificates_shall_not_expire_in_less_than(days) :
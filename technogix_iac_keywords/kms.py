@@ -54,6 +54,14 @@ def keys_shall_rotate() :
             if not ('KeyRotationEnabled' in rotation and rotation['KeyRotationEnabled']) :
                 raise Exception('Key ' + key['KeyId'] + ' does not rotate')
 
+@keyword("Keys Shall Not Be Public")
+def keys_shall_not_be_public() :
+    """ Test that no key policy allows everyone to use a key """
+    result = KMS_TOOLS.list_keys()
+    for key in result :
+        if KMS_TOOLS.is_key_public(key) :
+            raise Exception('Key ' + key['KeyId'] + ' policy allows public access')
+
 @keyword('Key Shall Exist And Match')
 def key_shall_exist_and_match(specs) :
     """ Check that a key exists that matches the specifications
@@ -111,15 +119,24 @@ def no_key_in_regions(regions, access_key, secret_key) :
         secret_key (str)  : Secret key associated to the previous access key
     """
     logger.info(dumps(regions))
-    local_tools = KMSTools()
-    for region in regions :
-        local_tools.initialize(None, access_key, secret_key, region = region)
-        keys = local_tools.list_keys()
-        keys = remove_type_from_list(keys,datetime)
-        for key in keys :
+
+    def list_forbidden_keys(tool) :
+        """ List the keys a region shall not host
+            ---
+            tool (KMSTools) : Tool initialized in the region to analyze
+        """
+        result = []
+        for key in tool.list_keys() :
             if key['KeyManager'] != 'AWS' :
-                if (region != 'eu-west-3' or key['KeyState'] == 'Enabled') :
+                if (tool.m_region != 'eu-west-3' or key['KeyState'] == 'Enabled') :
                     # Exception for eu-west-3, I tried some testing in it, and
                     # therefore there are remaining keys waiting for deletion
-                    raise Exception('Found key ' + dumps(key) + \
-                        ' in region ' + region)
+                    result.append(key)
+        return result
+
+    result = KMSTools.scan_regions(regions, list_forbidden_keys, access_key = access_key, \
+        secret_key = secret_key)
+    for region, keys in result.items() :
+        keys = remove_type_from_list(keys,datetime)
+        for key in keys :
+            raise Exception('Found key ' + dumps(key) + ' in region ' + region)
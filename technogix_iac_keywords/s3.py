@@ -14,6 +14,7 @@
 from sys import path as syspath
 from os import path
 from datetime import datetime
+from json import loads, dumps
 
 # Robotframework includes
 from robot.api import logger
@@ -52,6 +53,41 @@ def upload_s3_file(bucket, filename, s3object) :
     """
     S3_TOOLS.upload_file(bucket, filename, s3object)
 
+@keyword("Upload S3 Directory")
+def upload_s3_directory(bucket, directory, prefix = '', part_size = 8, concurrency = 10) :
+    """ Upload all the files of a directory to an S3 bucket
+        ---
+        bucket      (str) : Bucket to add files to
+        directory   (str) : Directory to upload
+        prefix      (str) : Prefix to give to the files objects
+        part_size   (str) : Size of the parts of a multipart upload, in MB
+        concurrency (str) : Maximal number of parts of a file uploaded concurrently
+        ---
+        returns    (list) : Uploaded objects
+    """
+    result = S3_TOOLS.upload_directory(bucket, directory, prefix, \
+        int(part_size) * 1024 * 1024, int(concurrency))
+    logger.info(str(len(result)) + ' files uploaded')
+    return result
+
+@keyword("Sync S3 Prefix")
+def sync_s3_prefix(bucket, directory, prefix = '', part_size = 8, concurrency = 10) :
+    """ Upload the files of a directory to an S3 bucket, except the ones which object
+        already exists with the same size and etag
+        ---
+        bucket      (str) : Bucket to add files to
+        directory   (str) : Directory to upload
+        prefix      (str) : Prefix to give to the files objects
+        part_size   (str) : Size of the parts of a multipart upload, in MB
+        concurrency (str) : Maximal number of parts of a file uploaded concurrently
+        ---
+        returns    (list) : Uploaded objects
+    """
+    result = S3_TOOLS.upload_directory(bucket, directory, prefix, \
+        int(part_size) * 1024 * 1024, int(concurrency), skip_unchanged = True)
+    logger.info(str(len(result)) + ' files uploaded')
+    return result
+
 @keyword("S3 Object Shall Exist")
 def s3_object_shall_exist(bucket, s3object) :
     """ Tests if an object exist in bucket
@@ -62,6 +98,18 @@ def s3_object_shall_exist(bucket, s3object) :
     result = S3_TOOLS.object_exists(bucket, s3object)
     if not result : raise Exception("S3 object " + s3object + " does not exist in bucket " + bucket)
 
+@keyword("S3 Objects Shall Exist")
+def s3_objects_shall_exist(bucket, s3objects) :
+    """ Tests if a list of objects exist in bucket
+        ---
+        bucket    (str)  : Bucket to analyze
+        s3objects (list) : Objects to look for
+    """
+    result = S3_TOOLS.list_missing_objects(bucket, s3objects)
+    if len(result) > 0 :
+        raise Exception(str(len(result)) + " S3 objects do not exist in bucket " + bucket + \
+            ", including " + result[0])
+
 @keyword("S3 Object Shall Not Exist")
 def s3_object_shall_not_exist(bucket, s3object) :
     """ Check that an object does not exist in bucket
@@ -73,16 +121,149 @@ def s3_object_shall_not_exist(bucket, s3object) :
     if result : raise Exception("S3 object " + s3object + " exists in bucket " + bucket)
 
 @keyword("Can Get S3 Object")
-def can_get_s3_object(bucket) :
+def can_get_s3_object(bucket, mode = 'range') :
     """ Tests if objects can be downloaded from bucket
         ---
         bucket   (str) : Bucket to use
+        mode     (str) : 'range' to download the object first byte, 'head' to only retrieve
+                         the object metadata
     """
-    result = S3_TOOLS.list_objects(bucket, 10, 'STANDARD')
+    result = S3_TOOLS.list_objects(bucket, 1, 'STANDARD')
     if len(result) == 0 : raise Exception("No S3 object found")
-    result = S3_TOOLS.object_can_be_downloaded(bucket, result[0]['Key'])
+    result = S3_TOOLS.object_can_be_downloaded(bucket, result[0]['Key'], mode)
     if not result : raise Exception("S3 object can not be downloaded")
 
+@keyword("S3 Object Shall Match File")
+def s3_object_shall_match_file(bucket, s3object, filename, part_size = 8) :
+    """ Tests if an object content is identical to a local file
+        ---
+        bucket    (str) : Bucket to analyze
+        s3object  (str) : Object to compare
+        filename  (str) : Local file to compare object to
+        part_size (str) : Size of the parts compared concurrently, in MB
+    """
+    result = S3_TOOLS.object_matches_file(bucket, s3object, filename, \
+        int(part_size) * 1024 * 1024)
+    if not result : raise Exception("S3 object " + s3object + " does not match file " + filename)
+
+# pylint: disable=R0913
+@keyword("S3 Object Record Number Shall Be")
+def s3_object_record_number_shall_be(bucket, s3object, number, condition = None, \
+    input_format = 'CSV', compression = 'NONE') :
+    """ Tests the number of records of an object, counted by S3 without downloading the object
+        ---
+        bucket       (str) : Bucket to analyze
+        s3object     (str) : Object to query
+        number       (str) : Expected number of records
+        condition    (str) : S3 Select WHERE clause on the s alias, all records if None
+        input_format (str) : Object format : CSV (with header line), JSON (one document per
+                             line) or PARQUET
+        compression  (str) : Object compression : NONE, GZIP or BZIP2
+    """
+    result = S3_TOOLS.get_select(bucket).count_records(s3object, condition, \
+        input_format, compression)
+    if result != int(number) :
+        raise Exception("S3 object " + s3object + " contains " + str(result) + \
+            " records instead of " + str(number))
+# pylint: enable=R0913
+
+@keyword("S3 Object Shall Not Contain Records Matching")
+def s3_object_shall_not_contain_records_matching(bucket, s3object, condition, \
+    input_format = 'CSV', compression = 'NONE') :
+    """ Check that no record of an object matches a condition, S3 stopping the scan on the
+        first matching record
+        ---
+        bucket       (str) : Bucket to analyze
+        s3object     (str) : Object to query
+        condition    (str) : S3 Select WHERE clause on the s alias
+        input_format (str) : Object format : CSV, JSON or PARQUET
+        compression  (str) : Object compression : NONE, GZIP or BZIP2
+    """
+    result = S3_TOOLS.get_select(bucket).find_record(s3object, condition, input_format, \
+        compression)
+    if result is not None :
+        raise Exception("S3 object " + s3object + " contains record " + dumps(result))
+
+# pylint: disable=R0913
+@keyword("S3 Object Query Shall Return")
+def s3_object_query_shall_return(bucket, s3object, expression, records, \
+    input_format = 'CSV', compression = 'NONE') :
+    """ Tests the records returned by an S3 Select query on an object, records being compared
+        one by one as they are streamed
+        ---
+        bucket       (str) : Bucket to analyze
+        s3object     (str) : Object to query
+        expression   (str) : S3 Select SQL expression, querying the S3Object table
+        records      (str) : Json list of the expected records
+        input_format (str) : Object format : CSV, JSON or PARQUET
+        compression  (str) : Object compression : NONE, GZIP or BZIP2
+    """
+    expected = loads(records)
+    number = 0
+    for record in S3_TOOLS.get_select(bucket).iterate_records(s3object, expression, \
+        input_format, compression) :
+        if number >= len(expected) :
+            raise Exception("S3 object query returned unexpected record " + dumps(record))
+        if record != expected[number] :
+            raise Exception("S3 object query returned " + dumps(record) + \
+                " instead of " + dumps(expected[number]))
+        number = number + 1
+    if number < len(expected) :
+        raise Exception("S3 object query returned " + str(number) + \
+            " records instead of " + str(len(expected)))
+# pylint: enable=R0913
+
+@keyword("S3 Inventory Objects Shall Use Storage Classes")
+def s3_inventory_objects_shall_use_storage_classes(bucket, prefix, storage) :
+    """ Tests the storage class of all the objects of the latest inventory in a location
+        ---
+        bucket  (str) : Inventory destination bucket
+        prefix  (str) : Inventory location, ending with the inventory configuration id
+        storage (str) : Comma separated list of the allowed storage classes
+    """
+    checks = {'StorageClass' : [value.strip() for value in storage.split(',')]}
+    audit_s3_inventory(bucket, prefix, checks)
+
+@keyword("S3 Inventory Objects Shall Be Encrypted")
+def s3_inventory_objects_shall_be_encrypted(bucket, prefix, encryption = 'SSE-S3,SSE-KMS,SSE-C') :
+    """ Tests the encryption of all the objects of the latest inventory in a location
+        The inventory shall include the EncryptionStatus field
+        ---
+        bucket     (str) : Inventory destination bucket
+        prefix     (str) : Inventory location, ending with the inventory configuration id
+        encryption (str) : Comma separated list of the allowed encryption statuses
+    """
+    checks = {'EncryptionStatus' : [value.strip() for value in encryption.split(',')]}
+    audit_s3_inventory(bucket, prefix, checks)
+
+@keyword("S3 Inventory Objects Size Shall Be Between")
+def s3_inventory_objects_size_shall_be_between(bucket, prefix, min_size = None, max_size = None) :
+    """ Tests the size of all the objects of the latest inventory in a location
+        The inventory shall include the Size field
+        ---
+        bucket   (str) : Inventory destination bucket
+        prefix   (str) : Inventory location, ending with the inventory configuration id
+        min_size (str) : Minimal object size in bytes, not checked if None
+        max_size (str) : Maximal object size in bytes, not checked if None
+    """
+    checks = {}
+    if min_size is not None : checks['MinSize'] = int(min_size)
+    if max_size is not None : checks['MaxSize'] = int(max_size)
+    audit_s3_inventory(bucket, prefix, checks)
+
+def audit_s3_inventory(bucket, prefix, checks) :
+    """ Check all the objects of the latest inventory in a location, raising on non compliance
+        ---
+        bucket (str)  : Inventory destination bucket
+        prefix (str)  : Inventory location, ending with the inventory configuration id
+        checks (dict) : Checks to perform on each object
+    """
+    result = S3_TOOLS.audit_inventory(bucket, prefix, checks)
+    logger.info(str(result['objects']) + ' inventory objects audited')
+    if result['violations'] > 0 :
+        raise Exception(str(result['violations']) + ' inventory objects are not compliant, ' + \
+            'including ' + ', '.join([obj.get('Key', '') for obj in result['examples']]))
+
 @keyword("S3 Bucket Shall Exist")
 def s3_bucket_shall_exist(bucket, account) :
     """ Tests if a bucket exist
@@ -144,7 +325,10 @@ def empty_s3_bucket(bucket) :
         ---
         bucket   (str) : Bucket to empty
     """
-    S3_TOOLS.empty_bucket(bucket)
+    errors = S3_TOOLS.empty_bucket(bucket)
+    if len(errors) > 0 :
+        raise Exception(str(len(errors)) + ' objects could not be deleted from bucket ' + \
+            bucket + ', first error : ' + dumps(errors[0]))
 
 @keyword("Buckets Shall Be Encrypted")
 def buckets_shall_be_encrypted(account) :
@@ -152,9 +336,9 @@ def buckets_shall_be_encrypted(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, ['ServerSideEncryptionConfiguration'])
     for bkt in result :
-        if not S3_TOOLS.is_encrypted(bkt['Name'], account) :
+        if not S3_TOOLS.is_encryption_enabled(bkt['ServerSideEncryptionConfiguration']) :
             raise Exception ("Bucket " + bkt['Name'] + " is not encrypted")
 
 @keyword("Buckets Shall Use Versioning")
@@ -163,7 +347,7 @@ def buckets_shall_use_versioning(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, ['Versioning'])
     for bkt in result :
         logger.info(remove_type_from_dictionary(bkt,datetime))
         if not 'Versioning' in bkt or not 'Status' in bkt['Versioning'] or \
@@ -176,7 +360,7 @@ def buckets_shall_forbid_http_access(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, ['Policy'])
     for bkt in result :
         if not S3_TOOLS.is_preventing_http_access(bkt['Policy']) :
             raise Exception ("Bucket " + bkt['Name'] + " allow non tls access")
@@ -187,7 +371,7 @@ def buckets_shall_forbid_unencrypted_put(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, ['Policy'])
     for bkt in result :
         if not S3_TOOLS.is_preventing_unencrypted_put(bkt['Policy']) :
             raise Exception ("Bucket " + bkt['Name'] + " allow non encrypted put")
@@ -198,9 +382,9 @@ def bucket_shall_enforce_mfa_enabling(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, ['Versioning'])
     for bkt in result :
-        if not S3_TOOLS.enforce_mfa_deletion(bkt['Name'], account) :
+        if not S3_TOOLS.is_mfa_delete_enabled(bkt['Versioning']) :
             raise Exception("Bucket " + bkt['Name'] + " does not require MFA for deletion")
 
 @keyword("Macie Shall Secure All Buckets")
@@ -209,9 +393,10 @@ def bucket_shall_be_analyzed_with_macie(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, [], check_access = True)
+    classifications = S3_TOOLS.list_macie_classifications(account)
     for bkt in result :
-        if not S3_TOOLS.ensure_macie_is_activated(bkt['Name'], account) :
+        if not S3_TOOLS.ensure_macie_is_activated(bkt['Name'], account, classifications) :
             raise Exception("Bucket " + bkt['Name'] + " is not analyzed using Macie")
 
 @keyword("Buckets Shall Forbid Public Access")
@@ -220,7 +405,7 @@ def bucket_shall_block_public_access(account) :
         ---
         account  (str) : Account to check buckets from
     """
-    result = S3_TOOLS.list_buckets(account)
+    result = S3_TOOLS.list_buckets(account, ['PublicAccessBlockConfiguration'])
     for bkt in result :
         if  'PublicAccessBlockConfiguration' in bkt and \
             (   not bkt['PublicAccessBlockConfiguration']['BlockPublicAcls'] or \
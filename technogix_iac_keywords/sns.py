@@ -48,8 +48,7 @@ def subscriptions_shall_limit_allowed_users() :
 
     result = SNS_TOOLS.list_topics()
     for topic in result :
-        policy = topic['Attributes']['Policy']
-        if 'AWS' in policy and policy['AWS'] == "*" :
+        if SNS_TOOLS.is_topic_public(topic) :
             raise Exception('Topic policy enable evrybody to do an action')
 
 @keyword('Subscriptions Shall Exist And Match')
@@ -34,11 +34,20 @@ class ACMTools(Tool) :
         if self.m_is_active['acm'] :
             paginator = self.m_clients['acm'].get_paginator('list_certificates')
             response_iterator = paginator.paginate(CertificateStatuses=['ISSUED'])
+            certificates = []
             for response in response_iterator :
-                for cert in response['CertificateSummaryList'] :
-                    details = self.m_clients['acm'].describe_certificate(\
-                        CertificateArn=cert['CertificateArn'])
-                    details = details['Certificate']
-                    result.append(details)
+                certificates = certificates + response['CertificateSummaryList']
+            result = self.parallelize(self.describe_certificate, certificates)
 
         return result
+
+    def describe_certificate(self, certificate) :
+        """ Retrieve certificate details
+            ---
+            certificate (dict) : Certificate summary, as returned by list_certificates
+        """
+
+        details = self.m_clients['acm'].describe_certificate(\
+            CertificateArn=certificate['CertificateArn'])
+
+        return details['Certificate']
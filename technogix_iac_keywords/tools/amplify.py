@@ -34,17 +34,25 @@ class AmplifyTools(Tool) :
         if self.m_is_active['amplify'] :
             paginator = self.m_clients['amplify'].get_paginator('list_apps')
             response_iterator = paginator.paginate()
+            apps = []
             for response in response_iterator :
-                for app in response['apps'] :
-                    apid = app['appId']
-                    branches = self.m_clients['amplify'].list_branches(appId = apid)
-                    app['branches'] = branches['branches']
-                    webhooks = self.m_clients['amplify'].list_webhooks(appId = apid)
-                    app['webhooks'] = webhooks['webhooks']
-                    domains = self.m_clients['amplify'].list_domain_associations(appId = apid)
-                    app['domains'] = domains['domainAssociations']
-
-                    result.append(app)
-
+                apps = apps + response['apps']
+            result = self.parallelize(self.describe_application, apps)
 
         return result
+
+    def describe_application(self, app) :
+        """ Add branches, webhooks and domains to an application description
+            ---
+            app (dict) : Application, as returned by list_applications
+        """
+
+        apid = app['appId']
+        branches = self.m_clients['amplify'].list_branches(appId = apid)
+        app['branches'] = branches['branches']
+        webhooks = self.m_clients['amplify'].list_webhooks(appId = apid)
+        app['webhooks'] = webhooks['webhooks']
+        domains = self.m_clients['amplify'].list_domain_associations(appId = apid)
+        app['domains'] = domains['domainAssociations']
+
+        return app
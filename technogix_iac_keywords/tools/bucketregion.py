@@ -0,0 +1,115 @@
+""" -----------------------------------------------------
+# TECHNOGIX
+# -------------------------------------------------------
+# Copyright (c) [2022] Technogix SARL
+# All rights reserved
+# -------------------------------------------------------
+# Tool functions to remember in which region s3 buckets are
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @18 october 2026
+# Latest revision: 18 october 2026
+# --------------------------------------------------- """
+
+# System includes
+from threading import Lock
+
+class BucketRegionCache :
+    """ Class storing the region of the buckets already located. A bucket region is forgotten
+        when a request routed with it is redirected or does not find the bucket, since the
+        bucket may have been removed and created again in another region """
+
+    # Error codes of the requests sent to a region the bucket is not in, or to a bucket that
+    # no longer exists
+    s_misrouted_codes = [
+        'NoSuchBucket', 'PermanentRedirect', 'TemporaryRedirect',
+        'AuthorizationHeaderMalformed', 'IllegalLocationConstraintException'
+    ]
+
+    # Identifier of the client events handlers, so that they are registered only once
+    s_handler_id = 'technogix-bucket-region'
+
+    def __init__(self):
+        """ Constructor """
+        self.m_lock = Lock()
+        self.m_regions = {}
+
+    def is_known(self, bucket) :
+        """ Test if a bucket region is known
+            ---
+            bucket  (str)  : Bucket to analyze
+            ---
+            returns (bool) : True if the bucket region is known, False otherwise
+        """
+        with self.m_lock :
+            result = bucket in self.m_regions
+        return result
+
+    def get(self, bucket, default) :
+        """ Returns the region of a bucket
+            ---
+            bucket  (str) : Bucket to analyze
+            default (str) : Region to return if the bucket region is not known
+            ---
+            returns (str) : Bucket region
+        """
+        with self.m_lock :
+            result = self.m_regions.get(bucket, default)
+        return result
+
+    def set(self, bucket, region) :
+        """ Memorize the region of a bucket
+            ---
+            bucket (str) : Bucket located
+            region (str) : Bucket region
+        """
+        with self.m_lock :
+            self.m_regions[bucket] = region
+
+    def forget(self, bucket) :
+        """ Forget the region of a bucket, so that it is located again on its next use
+            ---
+            bucket (str) : Bucket to forget
+        """
+        with self.m_lock :
+            self.m_regions.pop(bucket, None)
+
+    def track(self, client) :
+        """ Watch the requests of an s3 client, so that misrouted buckets are forgotten
+            ---
+            client (Client) : S3 client routing requests with the cached regions
+        """
+        client.meta.events.register('provide-client-params.s3', self.remember_bucket, \
+            unique_id = self.s_handler_id + '-params')
+        client.meta.events.register('after-call.s3', self.check_routing, \
+            unique_id = self.s_handler_id + '-call')
+
+    def remember_bucket(self, params, context, **_) :
+        """ Botocore handler storing the bucket a request addresses in the request context
+            ---
+            params  (dict) : Request parameters
+            context (dict) : Request context
+        """
+        if 'Bucket' in params : context['technogix_bucket'] = params['Bucket']
+
+    def check_routing(self, http_response, parsed, model, context, **_) :
+        """ Botocore handler forgetting the bucket of a request that has been misrouted
+            ---
+            http_response (AWSResponse)    : Request http response
+            parsed        (dict)           : Parsed response
+            model         (OperationModel) : Request operation
+            context       (dict)           : Request context
+        """
+
+        bucket = context.get('technogix_bucket')
+        status = http_response.status_code
+        code = parsed.get('Error', {}).get('Code')
+
+        # Botocore follows s3 redirections by itself : they are only visible in the context
+        is_misrouted = context.get('s3_redirect', {}).get('redirected', False) or \
+            status in [301, 307] or code in self.s_misrouted_codes or \
+            (model.name == 'HeadBucket' and status == 404)
+
+        if bucket is not None and is_misrouted : self.forget(bucket)
+
+# Region of the buckets already located, shared by all the tools of the process
+BUCKET_REGIONS = BucketRegionCache()
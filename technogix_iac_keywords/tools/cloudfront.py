@@ -35,10 +35,21 @@ class CloudfrontTools(Tool) :
         if self.m_is_active['cloudfront'] :
             paginator = self.m_clients['cloudfront'].get_paginator('list_distributions')
             response_iterator = paginator.paginate()
+            distributions = []
             for response in response_iterator :
-                # Only way to get logging information is to do an additional get_distribution
-                for distribution in response['DistributionList']['Items'] :
-                    details = self.m_clients['cloudfront'].get_distribution(Id=distribution['Id'])
-                    result.append(details['Distribution'])
+                if 'Items' in response['DistributionList'] :
+                    distributions = distributions + response['DistributionList']['Items']
+            # Only way to get logging information is to do an additional get_distribution
+            result = self.parallelize(self.get_distribution, distributions)
 
         return result
+
+    def get_distribution(self, distribution) :
+        """ Retrieve distribution details
+            ---
+            distribution (dict) : Distribution summary, as returned by list_distributions
+        """
+
+        details = self.m_clients['cloudfront'].get_distribution(Id=distribution['Id'])
+
+        return details['Distribution']
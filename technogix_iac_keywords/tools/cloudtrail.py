@@ -34,18 +34,28 @@ class CloudtrailTools(Tool) :
         if self.m_is_active['cloudtrail'] :
             paginator = self.m_clients['cloudtrail'].get_paginator('list_trails')
             response_iterator = paginator.paginate()
+            trails = []
             for response in response_iterator :
-                for trail in response['Trails']     :
-                    details = self.m_clients['cloudtrail'].describe_trails( \
-                        trailNameList = [trail['TrailARN']])
-                    details = details['trailList'][0]
-                    tags    = self.m_clients['cloudtrail'].list_tags( \
-                        ResourceIdList = [trail['TrailARN']])
-                    details['Tags'] = tags['ResourceTagList'][0]['TagsList']
-                    result.append(details)
+                trails = trails + response['Trails']
+            result = self.parallelize(self.describe_trail, trails)
 
         return result
 
+    def describe_trail(self, trail) :
+        """ Retrieve trail details and tags
+            ---
+            trail    (dict) : Trail summary, as returned by list_trails
+        """
+
+        details = self.m_clients['cloudtrail'].describe_trails( \
+            trailNameList = [trail['TrailARN']])
+        details = details['trailList'][0]
+        tags    = self.m_clients['cloudtrail'].list_tags( \
+            ResourceIdList = [trail['TrailARN']])
+        details['Tags'] = tags['ResourceTagList'][0]['TagsList']
+
+        return details
+
     def get_status(self, trail) :
         """ Returns a specific trail status
             ---
@@ -34,15 +34,25 @@ class CloudwatchTools(Tool) :
         if self.m_is_active['logs'] :
             paginator = self.m_clients['logs'].get_paginator('describe_log_groups')
             response_iterator = paginator.paginate()
+            groups = []
             for response in response_iterator :
-                for group in response['logGroups'] :
-                    tags = self.m_clients['logs'].list_tags_log_group( \
-                        logGroupName=group['logGroupName'])
-                    group['Tags'] = tags['tags']
-                    result.append(group)
+                groups = groups + response['logGroups']
+            result = self.parallelize(self.describe_group, groups)
 
         return result
 
+    def describe_group(self, group) :
+        """ Add tags to a loggroup description
+            ---
+            group (dict) : Loggroup, as returned by list_groups
+        """
+
+        tags = self.m_clients['logs'].list_tags_log_group( \
+            logGroupName=group['logGroupName'])
+        group['Tags'] = tags['tags']
+
+        return group
+
     def list_metric_alarms(self) :
         """ Returns all metric alarms """
 
@@ -71,15 +71,24 @@ class DynamoDBTools(Tool) :
         if self.m_is_active['dynamodb'] :
             paginator = self.m_clients['dynamodb'].get_paginator('list_tables')
             response_iterator = paginator.paginate()
+            tables = []
             for response in response_iterator :
-                for table in response['TableNames'] :
-                    description = self.m_clients['dynamodb'].describe_table(TableName = table)
-                    description['Table']['Tags'] = []
-                    tags = self.m_clients['dynamodb'].get_paginator('list_tags_of_resource')
-                    tag_iterator = tags.paginate(ResourceArn=description['Table']['TableArn'])
-                    for tag in tag_iterator :
-                        description['Table']['Tags'] = description['Table']['Tags'] + tag['Tags']
-
-                    result.append(description['Table'])
+                tables = tables + response['TableNames']
+            result = self.parallelize(self.describe_table, tables)
 
         return result
+
+    def describe_table(self, table) :
+        """ Retrieve table description and tags
+            ---
+            table (str) : Name of the table to analyze
+        """
+
+        description = self.m_clients['dynamodb'].describe_table(TableName = table)
+        description['Table']['Tags'] = []
+        tags = self.m_clients['dynamodb'].get_paginator('list_tags_of_resource')
+        tag_iterator = tags.paginate(ResourceArn=description['Table']['TableArn'])
+        for tag in tag_iterator :
+            description['Table']['Tags'] = description['Table']['Tags'] + tag['Tags']
+
+        return description['Table']
@@ -18,6 +18,7 @@ from json import loads
 # Local include
 syspath.append(path.normpath(path.join(path.dirname(__file__), './')))
 from tool import Tool
+from policy import compile_policy
 
 class ECRTools(Tool) :
     """ Class providing tools to check AWS ECR compliance """
@@ -35,19 +36,38 @@ class ECRTools(Tool) :
         if self.m_is_active['ecr'] :
             paginator = self.m_clients['ecr'].get_paginator('describe_repositories')
             response_iterator = paginator.paginate()
+            repositories = []
             for response in response_iterator :
-                for repository in response['repositories'] :
-                    name = repository['repositoryName']
-                    arn = repository['repositoryArn']
-                    rid = repository['registryId']
-                    tags = self.m_clients['ecr'].list_tags_for_resource(resourceArn=arn)
-                    policy = self.m_clients['ecr'].get_repository_policy(repositoryName=name, \
-                        registryId=rid)
-                    lifecycle = self.m_clients['ecr'].get_lifecycle_policy(repositoryName=name, \
-                        registryId=rid)
-                    repository['Tags'] = tags['tags']
-                    repository['Policy'] = loads(policy['policyText'])
-                    repository['Lifecycle'] = loads(lifecycle['lifecyclePolicyText'])
-                    result.append(repository)
+                repositories = repositories + response['repositories']
+            result = self.parallelize(self.describe_repository, repositories)
 
         return result
+
+    def describe_repository(self, repository) :
+        """ Add tags, policy and lifecycle to a repository description
+            ---
+            repository (dict) : Repository, as returned by list_repositories
+        """
+
+        name = repository['repositoryName']
+        arn = repository['repositoryArn']
+        rid = repository['registryId']
+        tags = self.m_clients['ecr'].list_tags_for_resource(resourceArn=arn)
+        policy = self.m_clients['ecr'].get_repository_policy(repositoryName=name, \
+            registryId=rid)
+        lifecycle = self.m_clients['ecr'].get_lifecycle_policy(repositoryName=name, \
+            registryId=rid)
+        repository['Tags'] = tags['tags']
+        repository['Policy'] = loads(policy['policyText'])
+        repository['Lifecycle'] = loads(lifecycle['lifecyclePolicyText'])
+
+        return repository
+
+    def is_repository_public(self, repository) :
+        """ Test if a repository policy allows everyone to perform an action on the repository
+            ---
+            repository (dict) : Repository to analyze, as returned by list_repositories
+            ---
+            returns    (bool) : True if the repository policy allows public access
+        """
+        return compile_policy(repository['Policy']).allows_public_access()
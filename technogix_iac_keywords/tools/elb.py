@@ -34,11 +34,21 @@ class ELBTools(Tool) :
         if self.m_is_active['elbv2'] :
             paginator = self.m_clients['elbv2'].get_paginator('describe_load_balancers')
             response_iterator = paginator.paginate()
+            balancers = []
             for response in response_iterator :
-                for lb in response['LoadBalancers'] :
-                    listeners = self.m_clients['elbv2'].describe_listeners( \
-                        LoadBalancerArn=lb['LoadBalancerArn'])
-                    lb['Listeners'] = listeners['Listeners']
-                    result.append(lb)
+                balancers = balancers + response['LoadBalancers']
+            result = self.parallelize(self.describe_load_balancer, balancers)
 
         return result
+
+    def describe_load_balancer(self, lb) :
+        """ Add listeners to a load balancer description
+            ---
+            lb (dict) : Load balancer, as returned by list_load_balancers
+        """
+
+        listeners = self.m_clients['elbv2'].describe_listeners( \
+            LoadBalancerArn=lb['LoadBalancerArn'])
+        lb['Listeners'] = listeners['Listeners']
+
+        return lb
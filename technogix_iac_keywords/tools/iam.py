@@ -11,19 +11,213 @@
 # --------------------------------------------------- """
 
 # System includes
-from time import sleep
+from time import monotonic
+from functools import partial
 from sys import path as syspath
 from os import path
+from csv import reader
+from datetime import datetime
+from threading import Lock
 
 # Local include
 syspath.append(path.normpath(path.join(path.dirname(__file__), './')))
 from tool import Tool
+from policy import compile_policy, POLICY_CACHE
 
+class IAMSnapshot :
+    """ Class gathering the users, groups and roles of an account, with the relations between
+        them and the managed policies, as returned by get_account_authorization_details """
+
+    def __init__(self):
+        """ Constructor """
+        self.m_users = {}
+        self.m_groups = {}
+        self.m_roles = {}
+        self.m_group_users = {}
+        self.m_policy_roles = {}
+        self.m_policy_name_roles = {}
+
+    def add(self, response) :
+        """ Add a page of account authorization details to the snapshot
+            ---
+            response (dict) : get_account_authorization_details response
+        """
+
+        for user in response.get('UserDetailList', []) :
+            self.m_users[user['UserName']] = user
+            for group in user.get('GroupList', []) :
+                self.m_group_users.setdefault(group, []).append(user)
+        for group in response.get('GroupDetailList', []) :
+            self.m_groups[group['GroupName']] = group
+        for role in response.get('RoleDetailList', []) :
+            self.m_roles[role['RoleName']] = role
+            for policy in role.get('AttachedManagedPolicies', []) :
+                self.m_policy_roles.setdefault(policy['PolicyArn'], []).append(role)
+                self.m_policy_name_roles.setdefault(policy['PolicyName'], []).append(role)
+
+    def list_users(self) :
+        """ List all users of the snapshot """
+        return list(self.m_users.values())
+
+    def list_users_for_group(self, group) :
+        """ List all users in a group
+            ---
+            group (str) : Name of the group to analyze
+        """
+        return self.m_group_users.get(group, [])
+
+    def list_roles_for_policy(self, policy) :
+        """ List roles to which a managed policy is attached
+            ---
+            policy (dict) : Policy to analyze
+        """
+        return self.m_policy_roles.get(policy['Arn'], [])
+
+    def list_roles_for_policy_name(self, name) :
+        """ List roles to which a managed policy is attached
+            ---
+            name (str) : Name of the policy to analyze
+        """
+        return self.m_policy_name_roles.get(name, [])
+
+    def has_permission(self, username) :
+        """ Check that user has associated policies
+            ---
+            username (str) : Name of the user to analyze
+        """
+
+        result = False
+
+        user = self.m_users.get(username, {})
+        if len(user.get('AttachedManagedPolicies', [])) > 0 : result = True
+        if len(user.get('UserPolicyList', [])) > 0 : result = True
+
+        return result
+
+class CredentialReport :
+    """ Class parsing a credential report into typed columns, indexed by user """
+
+    # Columns containing booleans
+    s_booleans = ['password_enabled', 'mfa_active', 'access_key_1_active', \
+        'access_key_2_active', 'cert_1_active', 'cert_2_active']
+
+    # Columns containing dates
+    s_dates = ['user_creation_time', 'password_last_used', 'password_last_changed', \
+        'password_next_rotation', 'access_key_1_last_rotated', 'access_key_1_last_used_date', \
+        'access_key_2_last_rotated', 'access_key_2_last_used_date', 'cert_1_last_rotated', \
+        'cert_2_last_rotated']
+
+    def __init__(self, content, generated):
+        """ Constructor
+            ---
+            content   (str)      : Credential report csv content
+            generated (datetime) : Credential report generation time
+        """
+
+        self.m_generated = generated
+        self.m_columns = {}
+        self.m_users = {}
+
+        rows = list(reader(content.splitlines()))
+        header = rows[0] if len(rows) > 0 else []
+        for i_col, name in enumerate(header) :
+            values = [row[i_col] if i_col < len(row) else '' for row in rows[1:]]
+            if name in self.s_booleans : values = [value == 'true' for value in values]
+            elif name in self.s_dates : values = [self.parse_date(value) for value in values]
+            self.m_columns[name] = values
+        for i_row, user in enumerate(self.m_columns.get('user', [])) :
+            self.m_users[user] = i_row
+
+    def parse_date(self, value) :
+        """ Convert a credential report date
+            ---
+            value   (str)      : Date, or N/A, no_information, not_supported
+            ---
+            returns (datetime) : Converted date, None if the date is not available
+        """
+
+        result = None
+        try :
+            result = datetime.fromisoformat(value)
+        except ValueError : result = None
+
+        return result
+
+    def get_generation_time(self) :
+        """ Return the time the report has been generated """
+        return self.m_generated
+
+    def column(self, name) :
+        """ Return the values of a column, in users order
+            ---
+            name    (str)  : Column to return
+            ---
+            returns (list) : Typed values of the column
+        """
+        return self.m_columns[name]
+
+    def list_users(self) :
+        """ Return the users of the report, including <root_account> """
+        return self.m_columns.get('user', [])
+
+    def list_active_access_keys(self) :
+        """ Return the active access keys of the iam users, the root account being excluded
+            ---
+            returns (list) : Access keys, with their user, user creation time and key last
+                             rotation time
+        """
+
+        result = []
+
+        users = self.column('user')
+        created = self.column('user_creation_time')
+        for number in ['1', '2'] :
+            active = self.column('access_key_' + number + '_active')
+            rotated = self.column('access_key_' + number + '_last_rotated')
+            for i_row, user in enumerate(users) :
+                if active[i_row] and user != '<root_account>' :
+                    result.append({'user' : user, 'user_creation_time' : created[i_row], \
+                        'last_rotated' : rotated[i_row]})
+
+        return result
+
+    def row(self, user) :
+        """ Return the report values of a user
+            ---
+            user    (str)  : User to retrieve
+            ---
+            returns (dict) : Typed values associated to their column, None if user is unknown
+        """
+
+        result = None
+
+        if user in self.m_users :
+            result = {}
+            for name, values in self.m_columns.items() : result[name] = values[self.m_users[user]]
+
+        return result
 
 # pylint: disable=R0916, R0904
 class IAMTools(Tool) :
     """ Class providing tools to check AWS IAM compliance """
 
+    # Credential reports already retrieved, indexed by credentials, shared by all the tools
+    # of the process
+    s_reports = {}
+    s_reports_lock = Lock()
+
+    # Delay in seconds during which a retrieved credential report is reused
+    s_report_ttl = 4 * 3600
+
+    # Maximal delay in seconds to wait for a credential report generation
+    s_report_timeout = 300
+
+    # Maximal delay in seconds to wait for a change to be visible in IAM
+    s_propagation_timeout = 60
+
+    # Default number of concurrent users provisioning, kept low for IAM request rate limits
+    s_provisioning_workers = 5
+
     def __init__(self):
         """ Constructor """
         super().__init__()
@@ -39,6 +233,20 @@ class IAMTools(Tool) :
 
         if self.m_is_active['iam'] :
             self.m_clients['iam'].create_user(UserName = username)
+            result = self.add_access_key(username)
+
+        return result
+
+    def add_access_key(self, username) :
+        """ Creates new access key for a user in aws IAM
+            ---
+            username (str)  : Name of the user to create the key for
+            ---
+            returns  (dict) : Access and secret keys
+        """
+        result = {}
+
+        if self.m_is_active['iam'] :
             key = self.m_clients['iam'].create_access_key(UserName = username)
             result['access'] = key['AccessKey']['AccessKeyId']
             result['secret'] = key['AccessKey']['SecretAccessKey']
@@ -70,8 +278,31 @@ class IAMTools(Tool) :
 
         if self.m_is_active['iam'] :
             self.m_clients['iam'].add_user_to_group(UserName = username, GroupName = group)
-            # Need to sleep for group association  to be spread and recognized when used
-            sleep(10)
+            # Group association shall be spread to be recognized when used
+            if not self.wait_until(partial(self.is_user_in_group, username, group), \
+                self.s_propagation_timeout) :
+                raise Exception('User ' + username + ' not visible in group ' + group + \
+                    ' after ' + str(self.s_propagation_timeout) + ' seconds')
+
+    def is_user_in_group(self, username, group) :
+        """ Test if a user is a member of a group in aws IAM
+            ---
+            username (str)  : Name of the user to analyze
+            group    (str)  : Name of the group to look for
+            ---
+            returns  (bool) : True if the user is a member of the group, False otherwise
+        """
+
+        result = False
+
+        if self.m_is_active['iam'] :
+            paginator = self.m_clients['iam'].get_paginator('list_groups_for_user')
+            response_iterator = paginator.paginate(UserName = username)
+            for response in response_iterator :
+                for grp in response['Groups'] :
+                    if group == grp['GroupName'] : result = True
+
+        return result
 
     def remove_user_from_group( self, username, group) :
         """ Remove user from a given group in aws IAM
@@ -104,6 +335,99 @@ class IAMTools(Tool) :
                     self.m_clients['iam'].remove_user_from_group(\
                         UserName = username , GroupName = grpn)
 
+    def create_users(self, usernames, groups = None, max_workers = None) :
+        """ Create users concurrently in aws IAM, with an access key and group memberships
+            If a user can not be created, the removal of all the users created is attempted
+            ---
+            usernames   (list) : Names of the users to create
+            groups      (list) : Names of the groups to add users to (default = None)
+            max_workers (int)  : Maximal number of users created concurrently
+            ---
+            returns     (dict) : Users access and secret keys, indexed by user name
+        """
+
+        result = {}
+
+        if max_workers is None : max_workers = self.s_provisioning_workers
+        if groups is None : groups = []
+
+        outcomes = self.parallelize(partial(self.create_user, groups = groups), usernames, \
+            max_workers)
+        errors = [outcome['error'] for outcome in outcomes if 'error' in outcome]
+        for username, outcome in zip(usernames, outcomes) :
+            if not 'error' in outcome : result[username] = outcome
+
+        if len(errors) > 0 :
+            # Rollback errors shall not hide the creation errors
+            message = str(len(errors)) + ' users could not be created : ' + ', '.join(errors)
+            rollback = self.parallelize(self.try_remove_user, list(result.keys()), max_workers)
+            rollback = [error for error in rollback if error is not None]
+            if len(rollback) > 0 :
+                message = message + ' - ' + str(len(rollback)) + \
+                    ' users could not be removed : ' + ', '.join(rollback)
+            raise Exception(message)
+
+        return result
+
+    def create_user(self, username, groups) :
+        """ Create a user in aws IAM with an access key and group memberships, removing
+            the user if it can not be completely provisioned
+            ---
+            username (str)  : Name of the user to create
+            groups   (list) : Names of the groups to add user to
+            ---
+            returns  (dict) : User access and secret keys, or the provisioning error
+        """
+
+        result = {}
+
+        # A user that already existed shall not be removed on failure
+        is_created = False
+        try :
+            if self.m_is_active['iam'] :
+                self.m_clients['iam'].create_user(UserName = username)
+                is_created = True
+                result = self.add_access_key(username)
+                for group in groups : self.add_user_to_group(username, group)
+        except Exception as error :
+            result = {'error' : username + ' (' + str(error) + ')'}
+            if is_created : self.try_remove_user(username)
+
+        return result
+
+    def remove_users(self, usernames, max_workers = None) :
+        """ Remove users concurrently in aws IAM, with their access keys and group memberships
+            All users removals are attempted before errors are raised
+            ---
+            usernames   (list) : Names of the users to remove
+            max_workers (int)  : Maximal number of users removed concurrently
+        """
+
+        if max_workers is None : max_workers = self.s_provisioning_workers
+
+        errors = self.parallelize(self.try_remove_user, usernames, max_workers)
+        errors = [error for error in errors if error is not None]
+        if len(errors) > 0 :
+            raise Exception(str(len(errors)) + ' users could not be removed : ' + \
+                ', '.join(errors))
+
+    def try_remove_user(self, username) :
+        """ Remove user in aws IAM, returning the error instead of raising it
+            ---
+            username (str) : Name of the user to remove
+            ---
+            returns  (str) : Removal error, None if user has been removed
+        """
+
+        result = None
+
+        try :
+            self.remove_user(username)
+        except Exception as error :
+            result = username + ' (' + str(error) + ')'
+
+        return result
+
     def get_account_summary(self) :
         """ Retrieve account summary """
 
@@ -154,60 +478,59 @@ class IAMTools(Tool) :
 
         return result
 
-    def has_permission(self, username) :
+    def has_permission(self, username, snapshot = None) :
         """ Check that user has associated policies
             ---
-            username (str) : Name of the user to analyze
+            username (str)         : Name of the user to analyze
+            snapshot (IAMSnapshot) : Snapshot to analyze, taken if None
         """
-        result = False
 
-        if self.m_is_active['iam'] :
-            response = self.m_clients['iam'].list_attached_user_policies(UserName=username)
-            if len(response['AttachedPolicies']) > 0 : result = True
-            response = self.m_clients['iam'].list_user_policies(UserName=username)
-            if len(response['PolicyNames']) > 0 : result = True
+        if snapshot is None : snapshot = self.take_snapshot(['User'])
 
-        return result
+        return snapshot.has_permission(username)
 
     def is_giving_full_admin_privileges(self, policy) :
         """ Check that a policy is giving full administration privilege
             ---
-            policy (str) : Name of the policy to analyze
+            policy (dict) : Policy to analyze
         """
 
         result = False
 
         if self.m_is_active['iam'] :
-            arn = policy['Arn']
-            vid = policy['DefaultVersionId']
+            document = self.get_policy_document(policy)
+            result = compile_policy(document).allows('*', '*')
+
+        return result
+
+    def get_policy_document(self, policy) :
+        """ Return the document of a policy default version, downloading it only if it is
+            not already in the policy documents cache
+            ---
+            policy  (dict) : Policy to analyze, with its Arn and DefaultVersionId
+            ---
+            returns (dict) : Policy document
+        """
+
+        arn = policy['Arn']
+        vid = policy['DefaultVersionId']
+
+        return POLICY_CACHE.get(arn, vid, partial(self.fetch_policy_document, arn, vid))
+
+    def fetch_policy_document(self, arn, vid) :
+        """ Download a policy version document
+            ---
+            arn     (str)  : Policy arn
+            vid     (str)  : Policy version identifier
+            ---
+            returns (dict) : Policy document
+        """
+
+        result = {}
+
+        if self.m_is_active['iam'] :
             response = self.m_clients['iam'].get_policy_version(PolicyArn=arn,VersionId=vid)
-            content = response['PolicyVersion']['Document']['Statement']
-
-            if isinstance(content,str) :
-                if content['Effect'] == 'Allow' :
-                    if  (   'Resource' in content and
-                            (   (isinstance(content['Resource'],str) and \
-                                (content['Resource'] == '*')) or \
-                                (isinstance(content['Resource'],list) and \
-                                    ('*' in content['Resource'])))) and \
-                        (   'Action' in content and
-                            (   (isinstance(content['Action'],str) and \
-                                (content['Action'] == '*')) or \
-                                (isinstance(content['Action'],list) and \
-                                    ('*' in content['Action'])))) : result = True
-            elif isinstance(content,list) :
-                for statement in content :
-                    if statement['Effect'] == 'Allow' :
-                        if  ( 'Resource' in statement and
-                                (   (isinstance(statement['Resource'],str) and \
-                                    (statement['Resource'] == '*')) or \
-                                    (isinstance(statement['Resource'],list) and \
-                                        ('*' in statement['Resource'])))) and \
-                            (   'Action' in statement and
-                                (   (isinstance(statement['Action'],str) and \
-                                    (statement['Action'] == '*')) or \
-                                    (isinstance(statement['Action'],list) and \
-                                        ('*' in statement['Action'])))) : result = True
+            result = response['PolicyVersion']['Document']
 
         return result
 
@@ -237,23 +560,41 @@ class IAMTools(Tool) :
 
         return result
 
-    def list_users_for_group(self, group) :
+    def list_users_for_group(self, group, snapshot = None) :
         """ List all users in aws IAM group
             ---
-            group (str) : Name of the group to analyze
+            group    (str)         : Name of the group to analyze
+            snapshot (IAMSnapshot) : Snapshot to analyze, taken if None
         """
 
-        result = []
+        if snapshot is None : snapshot = self.take_snapshot(['User'])
+
+        return snapshot.list_users_for_group(group)
 
-        users = self.list_users()
+    def configure_policy_cache(self, directory) :
+        """ Persist the policy documents cache in a directory, for all the tools of the process
+            ---
+            directory (str) : Directory in which the documents shall be stored
+        """
+        POLICY_CACHE.configure(directory)
+
+    def take_snapshot(self, filters = None) :
+        """ Retrieve the account users, groups, roles and policies in a single sweep
+            ---
+            filters (list)        : Entity types to retrieve (User, Group, Role,
+                                    LocalManagedPolicy, AWSManagedPolicy), all if None
+            ---
+            returns (IAMSnapshot) : Account snapshot
+        """
+
+        result = IAMSnapshot()
 
         if self.m_is_active['iam'] :
-            for user in users :
-                paginator = self.m_clients['iam'].get_paginator('list_groups_for_user')
-                response_iterator = paginator.paginate(UserName = user['UserName'])
-                for response in response_iterator :
-                    for grp in response['Groups'] :
-                        if grp['GroupName'] == group : result.append(user)
+            parameters = {}
+            if filters is not None : parameters['Filter'] = filters
+            paginator = self.m_clients['iam'].get_paginator('get_account_authorization_details')
+            response_iterator = paginator.paginate(**parameters)
+            for response in response_iterator : result.add(response)
 
         return result
 
@@ -270,21 +611,27 @@ class IAMTools(Tool) :
 
         return result
 
-    def list_roles_for_policy(self, policy) :
+    def list_roles_for_policy(self, policy, snapshot = None) :
         """ List roles to which policy is attached
             ---
-            policy (str) : Name of the policy to analyze
+            policy   (dict)        : Policy to analyze
+            snapshot (IAMSnapshot) : Snapshot to analyze, taken if None
         """
 
-        result = []
+        if snapshot is None : snapshot = self.take_snapshot(['Role'])
 
-        if self.m_is_active['iam'] :
-            paginator = self.m_clients['iam'].get_paginator('list_entities_for_policy')
-            response_iterator = paginator.paginate(PolicyArn=policy['Arn'])
-            for response in response_iterator :
-                result = result + response['PolicyRoles']
+        return snapshot.list_roles_for_policy(policy)
 
-        return result
+    def list_roles_for_policy_name(self, name, snapshot = None) :
+        """ List roles to which a policy is attached, from the policy name
+            ---
+            name     (str)         : Name of the policy to analyze
+            snapshot (IAMSnapshot) : Snapshot to analyze, taken if None
+        """
+
+        if snapshot is None : snapshot = self.take_snapshot(['Role'])
+
+        return snapshot.list_roles_for_policy_name(name)
 
     def list_roles(self) :
         """ List roles """
@@ -358,37 +705,58 @@ class IAMTools(Tool) :
 
         return result
 
-    def parse_credential_report(self) :
-        """ Generate, retrieve and parse credential report"""
+    def configure_credential_report(self, ttl, timeout) :
+        """ Set the credential report cache time to live and generation timeout, for all the
+            tools of the process
+            ---
+            ttl     (int) : Delay in seconds during which a retrieved report is reused
+            timeout (int) : Maximal delay in seconds to wait for a report generation
+        """
+        IAMTools.s_report_ttl = ttl
+        IAMTools.s_report_timeout = timeout
 
-        result = {}
+    def is_credential_report_complete(self) :
+        """ Request a credential report generation and test if the report is available
+            ---
+            returns (bool) : True if the credential report is complete, False otherwise
+        """
+        response = self.m_clients['iam'].generate_credential_report()
+        return response['State'] == 'COMPLETE'
+
+    def get_credential_report(self) :
+        """ Return the account credential report, generating it if the report retrieved
+            previously is older than the cache time to live
+            ---
+            returns (CredentialReport) : Parsed credential report, None if IAM is not available
+        """
+
+        result = None
 
-        # Generate and retrieve report
         if self.m_is_active['iam'] :
-            # Generate and retrieve report
-            self.m_clients['iam'].generate_credential_report()
-
-            is_ready = False
-            while not is_ready :
-                try :
-                    response    = self.m_clients['iam'].get_credential_report()
-                except self.m_clients['iam'].exceptions.CredentialReportNotReadyException :
-                    is_ready = False
-                is_ready = True
-
-            # Decode content
-            content_string = str(response['Content'].decode('ascii'))
-            content = []
-            for row in content_string.split('\n') :
-                content.append(row.split(','))
-            result['content'] = content
-
-            # Associate header to column index
-            columns = {}
-            for i_col,col in enumerate(content[0]) :
-                columns[col] = i_col
-            result['columns'] = columns
+            with self.s_reports_lock :
+                if self.m_credentials in self.s_reports :
+                    retrieved, report = self.s_reports[self.m_credentials]
+                    if monotonic() - retrieved < self.s_report_ttl : result = report
+                if result is None :
+                    result = self.generate_credential_report()
+                    self.s_reports[self.m_credentials] = (monotonic(), result)
 
         return result
 
+    def generate_credential_report(self) :
+        """ Generate, retrieve and parse credential report
+            ---
+            returns (CredentialReport) : Parsed credential report
+        """
+
+        # Generation is polled with an increasing delay until the report is complete
+        if not self.wait_until(self.is_credential_report_complete, self.s_report_timeout, 1, 16) :
+            raise Exception('Credential report not generated after ' + \
+                str(self.s_report_timeout) + ' seconds')
+
+        response = self.m_clients['iam'].get_credential_report()
+        content = response['Content'].decode('utf-8')
+
+        return CredentialReport(content, response['GeneratedTime'])
+
 # pylint: enable=R0916, R0904
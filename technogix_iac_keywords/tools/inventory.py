@@ -0,0 +1,251 @@
+""" -----------------------------------------------------
+# TECHNOGIX
+# -------------------------------------------------------
+# Copyright (c) [2022] Technogix SARL
+# All rights reserved
+# -------------------------------------------------------
+# Tool functions to read and audit s3 inventory reports
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @18 october 2026
+# Latest revision: 18 october 2026
+# --------------------------------------------------- """
+
+# System includes
+from json import loads
+from gzip import GzipFile
+from io import TextIOWrapper
+from csv import reader
+from tempfile import TemporaryFile
+
+# Boto3 includes
+from botocore.exceptions import ClientError
+
+# Inventory columnar formats column names, with the matching csv schema field
+INVENTORY_COLUMNS = {
+    'bucket'                            : 'Bucket',
+    'key'                               : 'Key',
+    'version_id'                        : 'VersionId',
+    'is_latest'                         : 'IsLatest',
+    'is_delete_marker'                  : 'IsDeleteMarker',
+    'size'                              : 'Size',
+    'last_modified_date'                : 'LastModifiedDate',
+    'e_tag'                             : 'ETag',
+    'storage_class'                     : 'StorageClass',
+    'is_multipart_uploaded'             : 'IsMultipartUploaded',
+    'replication_status'                : 'ReplicationStatus',
+    'encryption_status'                 : 'EncryptionStatus',
+    'object_lock_retain_until_date'     : 'ObjectLockRetainUntilDate',
+    'object_lock_mode'                  : 'ObjectLockMode',
+    'object_lock_legal_hold_status'     : 'ObjectLockLegalHoldStatus',
+    'intelligent_tiering_access_tier'   : 'IntelligentTieringAccessTier',
+    'bucket_key_status'                 : 'BucketKeyStatus',
+    'checksum_algorithm'                : 'ChecksumAlgorithm'
+}
+
+# Number of records read at once from inventory columnar files
+INVENTORY_BATCH_SIZE = 10000
+
+class Inventory :
+    """ Class reading the s3 inventories delivered in a destination bucket """
+
+    def __init__(self, client, bucket):
+        """ Constructor
+            ---
+            client (Client) : S3 client addressing the destination bucket region
+            bucket (str)    : Inventory destination bucket
+        """
+        self.m_client = client
+        self.m_bucket = bucket
+
+    def find_manifest(self, prefix) :
+        """ Look for the manifest of the latest complete inventory delivered in a location
+            ---
+            prefix  (str) : Inventory location, ending with the inventory configuration id
+            ---
+            returns (str) : Key of the latest inventory manifest, None if no inventory found
+        """
+
+        result = None
+
+        if not prefix.endswith('/') : prefix = prefix + '/'
+
+        # Each inventory is delivered in a folder named after its date, that sorts in
+        # chronological order
+        folders = []
+        paginator = self.m_client.get_paginator('list_objects_v2')
+        response_iterator = paginator.paginate(Bucket = self.m_bucket, Prefix = prefix, \
+            Delimiter = '/')
+        for response in response_iterator :
+            for folder in response.get('CommonPrefixes', []) :
+                if folder['Prefix'].endswith('Z/') : folders.append(folder['Prefix'])
+
+        # The manifest is written once all files are delivered : an inventory being
+        # delivered is skipped
+        for folder in sorted(folders, reverse = True) :
+            if result is None and self.manifest_exists(folder + 'manifest.json') :
+                result = folder + 'manifest.json'
+
+        return result
+
+    def manifest_exists(self, key) :
+        """ Test if a manifest has been delivered
+            ---
+            key     (str)  : Manifest key
+            ---
+            returns (bool) : True if the manifest exists, False otherwise
+        """
+
+        result = False
+
+        try :
+            self.m_client.head_object(Bucket = self.m_bucket, Key = key)
+            result = True
+        except ClientError as error :
+            if not error.response['Error']['Code'] in ['404', 'NoSuchKey', 'NotFound'] :
+                raise
+
+        return result
+
+    def read_manifest(self, key) :
+        """ Retrieve an inventory manifest
+            ---
+            key     (str)  : Manifest key
+            ---
+            returns (dict) : Manifest content
+        """
+
+        response = self.m_client.get_object(Bucket = self.m_bucket, Key = key)
+        try :
+            result = loads(response['Body'].read().decode('utf-8'))
+        finally :
+            response['Body'].close()
+
+        return result
+
+    def iterate_file(self, manifest, key) :
+        """ Iterate over the objects listed in an inventory file, as the file is streamed
+            ---
+            manifest (dict) : Inventory manifest
+            key      (str)  : Inventory file key
+            ---
+            yields   (dict) : Inventory objects, with csv schema field names and typed values
+        """
+
+        file_format = manifest['fileFormat'].upper()
+
+        if file_format == 'CSV' :
+            fields = [field.strip() for field in manifest['fileSchema'].split(',')]
+            response = self.m_client.get_object(Bucket = self.m_bucket, Key = key)
+            try :
+                lines = TextIOWrapper(GzipFile(fileobj = response['Body']), \
+                    encoding = 'utf-8', newline = '')
+                for row in reader(lines) :
+                    yield type_object(dict(zip(fields, row)))
+            finally :
+                response['Body'].close()
+
+        else :
+            # Columnar formats can not be read from a stream : the file is spooled on disk
+            # and read by batches of records
+            with TemporaryFile() as file :
+                self.m_client.download_fileobj(self.m_bucket, key, file)
+                file.seek(0)
+                for batch in read_columnar_file(file, file_format) :
+                    for row in batch :
+                        obj = {}
+                        for column, value in row.items() :
+                            obj[INVENTORY_COLUMNS.get(column, column)] = value
+                        yield type_object(obj)
+
+    def audit_file(self, manifest, checks, number, key) :
+        """ Check the objects listed in an inventory file
+            ---
+            manifest (dict) : Inventory manifest
+            checks   (dict) : Allowed StorageClass and EncryptionStatus lists, MinSize and MaxSize
+            number   (int)  : Maximal number of non compliant objects to return
+            key      (str)  : Inventory file key
+            ---
+            returns  (dict) : Number of objects, number of non compliant objects and the first
+                              non compliant objects
+        """
+
+        result = {'objects' : 0, 'violations' : 0, 'examples' : []}
+
+        for obj in self.iterate_file(manifest, key) :
+            result['objects'] = result['objects'] + 1
+            if not object_complies(obj, checks) :
+                result['violations'] = result['violations'] + 1
+                if len(result['examples']) < int(number) : result['examples'].append(obj)
+
+        return result
+
+def read_columnar_file(file, file_format) :
+    """ Iterate over the records batches of an orc or parquet file
+        pyarrow is only required when such an inventory is read
+        ---
+        file        (file) : Seekable file to read
+        file_format (str)  : File format : ORC or PARQUET
+        ---
+        yields      (list) : Batches of records, as dictionaries
+    """
+
+    # pylint: disable=C0415
+    try :
+        if file_format == 'ORC' : from pyarrow import orc
+        else : from pyarrow import parquet
+    except ImportError as error :
+        raise Exception('pyarrow is required to read ' + file_format + ' inventories') \
+            from error
+    # pylint: enable=C0415
+
+    if file_format == 'ORC' :
+        content = orc.ORCFile(file)
+        for i_stripe in range(content.nstripes) :
+            yield content.read_stripe(i_stripe).to_pylist()
+    else :
+        content = parquet.ParquetFile(file)
+        for batch in content.iter_batches(batch_size = INVENTORY_BATCH_SIZE) :
+            yield batch.to_pylist()
+
+def type_object(obj) :
+    """ Convert the csv inventory values to the types of the columnar formats
+        ---
+        obj     (dict) : Inventory object
+        ---
+        returns (dict) : Inventory object with typed values
+    """
+
+    result = obj
+
+    for field in ['IsLatest', 'IsDeleteMarker', 'IsMultipartUploaded'] :
+        if isinstance(result.get(field), str) : result[field] = (result[field] == 'true')
+    if isinstance(result.get('Size'), str) :
+        if len(result['Size']) > 0 : result['Size'] = int(result['Size'])
+        else : result['Size'] = None
+
+    return result
+
+def object_complies(obj, checks) :
+    """ Test if an inventory object complies with a set of checks
+        ---
+        obj     (dict) : Inventory object
+        checks  (dict) : Allowed StorageClass and EncryptionStatus lists, MinSize and MaxSize
+        ---
+        returns (bool) : True if the object complies with all the checks, False otherwise
+    """
+
+    result = True
+
+    # Delete markers are no objects : they have no storage, encryption nor size
+    if not obj.get('IsDeleteMarker', False) :
+        if 'StorageClass' in checks and not obj.get('StorageClass') in checks['StorageClass'] :
+            result = False
+        if 'EncryptionStatus' in checks and \
+            not obj.get('EncryptionStatus') in checks['EncryptionStatus'] :
+            result = False
+        if 'MinSize' in checks and (obj.get('Size') is None or obj['Size'] < checks['MinSize']) :
+            result = False
+        if 'MaxSize' in checks and (obj.get('Size') is None or obj['Size'] > checks['MaxSize']) :
+            result = False
+
+    return result
@@ -18,6 +18,7 @@ from json import loads
 # Local include
 syspath.append(path.normpath(path.join(path.dirname(__file__), './')))
 from tool import Tool
+from policy import compile_policy
 
 # pylint: disable=R1702
 class KMSTools(Tool) :
@@ -34,55 +35,75 @@ class KMSTools(Tool) :
         result = []
 
         if self.m_is_active['kms'] :
+            keys = []
             paginator = self.m_clients['kms'].get_paginator('list_keys')
             response_iterator = paginator.paginate()
             for response in response_iterator :
-                for key in response['Keys']     :
-                    details = self.m_clients['kms'].describe_key(KeyId = key['KeyId'])
-                    details = details['KeyMetadata']
-                    policy = self.m_clients['kms'].get_key_policy(KeyId = key['KeyId'], \
-                        PolicyName='default')
-                    tags = []
-                    if details['KeyManager'] == 'CUSTOMER' :
-                        # If not, the service principal will not have the right to retrieve tags
-                        shall_continue = True
-                        marker = None
-                        while shall_continue :
-                            kid = key['KeyId']
-                            if marker is not None   :
-                                response = self.m_clients['kms'].list_resource_tags(KeyId = kid, \
-                                    NextToken = marker)
-                            else :
-                                response = self.m_clients['kms'].list_resource_tags(KeyId = kid)
-                            tags = tags + response['Tags']
-                            if 'NextToken' in response          : marker = response['NextToken']
-                            else                                : shall_continue = False
-                    details['Policy'] = loads(policy['Policy'])
-                    details['Tags'] = tags
-                    result.append(details)
+                keys = keys + response['Keys']
+            result = self.parallelize(self.describe_key, keys)
 
         return result
 
+    def describe_key(self, key) :
+        """ Retrieve key details, policy and tags
+            ---
+            key (dict) : Key to analyze, as returned by list_keys
+        """
+
+        details = self.m_clients['kms'].describe_key(KeyId = key['KeyId'])
+        details = details['KeyMetadata']
+        policy = self.m_clients['kms'].get_key_policy(KeyId = key['KeyId'], \
+            PolicyName='default')
+        tags = []
+        if details['KeyManager'] == 'CUSTOMER' :
+            # If not, the service principal will not have the right to retrieve tags
+            shall_continue = True
+            marker = None
+            while shall_continue :
+                kid = key['KeyId']
+                if marker is not None   :
+                    response = self.m_clients['kms'].list_resource_tags(KeyId = kid, \
+                        NextToken = marker)
+                else :
+                    response = self.m_clients['kms'].list_resource_tags(KeyId = kid)
+                tags = tags + response['Tags']
+                if 'NextToken' in response          : marker = response['NextToken']
+                else                                : shall_continue = False
+        details['Policy'] = loads(policy['Policy'])
+        details['Tags'] = tags
+
+        return details
+
     def list_aliases(self) :
         """ List all aliases """
 
         result = []
         if self.m_is_active['kms'] :
+            aliases = []
             paginator = self.m_clients['kms'].get_paginator('list_aliases')
             response_iterator = paginator.paginate()
             for response in response_iterator :
-                for alias in response['Aliases'] :
-                    if 'TargetKeyId' in alias :
-                        details = self.m_clients['kms'].describe_key(KeyId = alias['TargetKeyId'])
-                        details = details['KeyMetadata']
-                    else :
-                        details = {}
-                    details['AliasName'] = alias['AliasName']
-                    details['AliasArn'] = alias['AliasArn']
-                    result.append(details)
+                aliases = aliases + response['Aliases']
+            result = self.parallelize(self.describe_alias, aliases)
 
         return result
 
+    def describe_alias(self, alias) :
+        """ Retrieve the details of the key targeted by an alias
+            ---
+            alias (dict) : Alias to analyze, as returned by list_aliases
+        """
+
+        if 'TargetKeyId' in alias :
+            details = self.m_clients['kms'].describe_key(KeyId = alias['TargetKeyId'])
+            details = details['KeyMetadata']
+        else :
+            details = {}
+        details['AliasName'] = alias['AliasName']
+        details['AliasArn'] = alias['AliasArn']
+
+        return details
+
     def get_rotation(self, key) :
         """ Get rotation status for key
             ---
@@ -95,4 +116,13 @@ class KMSTools(Tool) :
 
         return response
 
+    def is_key_public(self, key) :
+        """ Test if a key policy allows everyone to use the key
+            ---
+            key     (dict) : Key to analyze, as returned by list_keys
+            ---
+            returns (bool) : True if the key policy allows public access, False otherwise
+        """
+        return compile_policy(key['Policy']).allows_public_access()
+
 # pylint: enable=R1702
@@ -0,0 +1,348 @@
+""" -----------------------------------------------------
+# TECHNOGIX
+# -------------------------------------------------------
+# Copyright (c) [2022] Technogix SARL
+# All rights reserved
+# -------------------------------------------------------
+# Tool functions to evaluate aws policy documents
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @18 october 2026
+# Latest revision: 18 october 2026
+# --------------------------------------------------- """
+
+# System includes
+from os import path, makedirs
+from json import loads, dumps
+from fnmatch import fnmatchcase
+from hashlib import sha256
+from threading import Lock
+
+# Condition keys restricting the principals a statement applies to
+RESTRICTING_KEYS = [
+    'aws:principalaccount', 'aws:principalarn', 'aws:principalorgid', 'aws:principalorgpaths',
+    'aws:sourceaccount', 'aws:sourcearn', 'aws:sourceowner', 'aws:sourceip', 'aws:sourcevpc',
+    'aws:sourcevpce', 'aws:userid', 'aws:username', 'kms:calleraccount'
+]
+
+class PolicyDocument :
+    """ Class normalizing and indexing a policy document, so that it can be analyzed
+        several times without walking its raw content """
+
+    def __init__(self, document):
+        """ Constructor
+            ---
+            document (dict) : Policy document, or its json string
+        """
+
+        if isinstance(document, str) : document = loads(document)
+
+        self.m_statements = {'Allow' : [], 'Deny' : []}
+        self.m_principals = {'Allow' : {}, 'Deny' : {}}
+        self.m_conditions = {'Allow' : {}, 'Deny' : {}}
+
+        content = []
+        if isinstance(document, dict) : content = document.get('Statement', [])
+        if isinstance(content, dict) : content = [content]
+
+        for raw in content :
+            statement = self.normalize_statement(raw)
+            effect = statement['Effect']
+            if effect in self.m_statements :
+                self.m_statements[effect].append(statement)
+                for principal in statement['Principals'] :
+                    self.m_principals[effect].setdefault(principal, []).append(statement)
+                for condition in statement['Conditions'] :
+                    self.m_conditions[effect].setdefault(condition[1], []).append(statement)
+
+    def normalize_statement(self, statement) :
+        """ Convert a raw statement into lists of lower case values
+            ---
+            statement (dict) : Statement to normalize
+            ---
+            returns   (dict) : Normalized statement
+        """
+
+        result = {
+            'Sid'           : statement.get('Sid'),
+            'Effect'        : statement.get('Effect'),
+            'Actions'       : to_lower_list(statement.get('Action')),
+            'NotActions'    : to_lower_list(statement.get('NotAction')),
+            'Resources'     : to_lower_list(statement.get('Resource')),
+            'NotResources'  : to_lower_list(statement.get('NotResource')),
+            'Principals'    : self.normalize_principals(statement.get('Principal')),
+            'NotPrincipals' : self.normalize_principals(statement.get('NotPrincipal')),
+            'Conditions'    : {}
+        }
+
+        # Conditions are indexed by operator and key, keys being case insensitive
+        for operator, keys in statement.get('Condition', {}).items() :
+            for key, values in keys.items() :
+                result['Conditions'][(operator.lower(), key.lower())] = to_lower_list(values)
+
+        return result
+
+    def normalize_principals(self, principal) :
+        """ Convert a raw principal into the list of principals values, whatever their type
+            ---
+            principal (str or dict) : Principal to normalize
+            ---
+            returns   (list)        : Principals values, '*' standing for everyone
+        """
+
+        result = []
+
+        if isinstance(principal, str) : result = [principal]
+        elif isinstance(principal, dict) :
+            for values in principal.values() : result = result + to_list(values)
+
+        return result
+
+    # pylint: disable=R0913
+    def statements(self, effect, action = None, resource = None, principal = None, \
+        condition_key = None) :
+        """ Return the statements of an effect applying to a request
+            ---
+            effect        (str)  : Allow or Deny
+            action        (str)  : Action the statements shall cover, may be a wildcard. Any
+                                   action if None
+            resource      (str)  : Resource the statements shall cover, may be a wildcard. Any
+                                   resource if None
+            principal     (str)  : Principal value the statements shall explicitly contain.
+                                   Any principal if None
+            condition_key (str)  : Condition key the statements shall use. Any condition if None
+            ---
+            returns       (list) : Normalized statements
+        """
+
+        result = self.m_statements.get(effect, [])
+        if condition_key is not None :
+            result = self.m_conditions.get(effect, {}).get(condition_key.lower(), [])
+        if principal is not None :
+            principals = self.m_principals.get(effect, {}).get(principal, [])
+            result = [statement for statement in result if statement in principals]
+
+        if action is not None :
+            result = [statement for statement in result if \
+                covers(statement['Actions'], statement['NotActions'], action)]
+        if resource is not None :
+            result = [statement for statement in result if \
+                covers(statement['Resources'], statement['NotResources'], resource)]
+
+        return result
+    # pylint: enable=R0913
+
+    def allows(self, action, resource = '*') :
+        """ Test if the policy allows an action on a resource
+            ---
+            action   (str)  : Action to analyze, may be a wildcard
+            resource (str)  : Resource to analyze, may be a wildcard
+            ---
+            returns  (bool) : True if an Allow statement covers the action on the resource
+        """
+        return len(self.statements('Allow', action, resource)) > 0
+
+    def denies_when(self, action, operator, key, value) :
+        """ Test if the policy denies an action when a condition is met
+            ---
+            action   (str)  : Action to analyze, may be a wildcard
+            operator (str)  : Condition operator (Bool, Null, StringEquals, ...)
+            key      (str)  : Condition key
+            value    (str)  : Condition value for which the action shall be denied
+            ---
+            returns  (bool) : True if a Deny statement covers the action under this condition
+        """
+
+        result = False
+
+        for statement in self.statements('Deny', action, condition_key = key) :
+            values = statement['Conditions'].get((operator.lower(), key.lower()), [])
+            if str(value).lower() in values : result = True
+
+        return result
+
+    def allows_public_access(self, action = None) :
+        """ Test if the policy allows everyone to perform an action, without a condition
+            restricting the principals it applies to
+            ---
+            action  (str)  : Action to analyze, may be a wildcard. Any action if None
+            ---
+            returns (bool) : True if the policy allows public access, False otherwise
+        """
+
+        result = False
+
+        for statement in self.statements('Allow', action, principal = '*') :
+            keys = [condition[1] for condition in statement['Conditions']]
+            if len([key for key in keys if key in RESTRICTING_KEYS]) == 0 : result = True
+
+        return result
+
+def to_list(value) :
+    """ Convert a policy value that can be a single item or a list into a list
+        ---
+        value   (str or list) : Value to convert
+        ---
+        returns (list)        : Value items
+    """
+
+    result = []
+    if isinstance(value, list) : result = value
+    elif value is not None : result = [value]
+
+    return result
+
+def to_lower_list(value) :
+    """ Convert a policy value into a list of lower case strings
+        ---
+        value   (str, bool or list) : Value to convert
+        ---
+        returns (list)              : Value items, as lower case strings
+    """
+    return [str(item).lower() for item in to_list(value)]
+
+def covers(patterns, not_patterns, value) :
+    """ Test if a statement action or resource patterns cover a value
+        A wildcard value is only covered by patterns matching it as a whole, so that '*' is
+        covered by '*' and 's3:*' is covered by 's3:*' or '*', but not by 's3:get*'
+        ---
+        patterns     (list) : Patterns of the statement Action or Resource
+        not_patterns (list) : Patterns of the statement NotAction or NotResource
+        value        (str)  : Value to analyze
+        ---
+        returns      (bool) : True if the patterns cover the value, False otherwise
+    """
+
+    result = False
+    value = value.lower()
+
+    if len(patterns) > 0 :
+        for pattern in patterns :
+            if fnmatchcase(value, pattern) : result = True
+    elif len(not_patterns) > 0 :
+        # A wildcard value may overlap the excluded patterns : it is only considered as covered
+        # if none of them can match it
+        result = True
+        for pattern in not_patterns :
+            if fnmatchcase(value, pattern) or ('*' in value and \
+                (fnmatchcase(pattern, value) or pattern.startswith(value.split('*')[0]))) :
+                result = False
+
+    return result
+
+class PolicyDocumentCache :
+    """ Class storing the policy documents by policy arn and version, so that a policy version
+        is only downloaded once. Documents are stored by content digest, so that identical
+        documents are only stored once """
+
+    # Arn part of the policies managed by aws, that are the only ones persisted : a customer
+    # policy can be deleted and created again with the same arn and version
+    s_persistent = ':aws:policy/'
+
+    def __init__(self):
+        """ Constructor """
+        self.m_lock = Lock()
+        self.m_directory = None
+        self.m_index = {}
+        self.m_documents = {}
+
+    def configure(self, directory) :
+        """ Persist the cache in a directory, loading the documents it already contains
+            ---
+            directory (str) : Directory in which the documents shall be stored
+        """
+
+        with self.m_lock :
+            self.m_directory = directory
+            makedirs(path.join(directory, 'documents'), exist_ok = True)
+            filename = path.join(directory, 'index.jsonl')
+            if path.isfile(filename) :
+                with open(filename, 'r', encoding='utf-8') as file :
+                    for line in file :
+                        if len(line.strip()) > 0 :
+                            entry = loads(line)
+                            self.m_index[entry['key']] = entry['digest']
+
+    def get(self, arn, version, fetch) :
+        """ Return a policy version document, fetching it if it is not in the cache
+            ---
+            arn     (str)      : Policy arn
+            version (str)      : Policy version identifier
+            fetch   (function) : Function without argument retrieving the document from aws
+            ---
+            returns (dict)     : Policy document
+        """
+
+        result = None
+        key = arn + '|' + version
+
+        with self.m_lock :
+            if key in self.m_index : result = self.load(self.m_index[key])
+
+        if result is None :
+            result = fetch()
+            digest = sha256(dumps(result, sort_keys = True).encode('utf-8')).hexdigest()
+            with self.m_lock :
+                self.m_index[key] = digest
+                self.m_documents[digest] = result
+                if self.m_directory is not None and self.s_persistent in arn :
+                    self.store(key, digest, result)
+
+        return result
+
+    def load(self, digest) :
+        """ Return a document from memory or from the cache directory
+            ---
+            digest  (str)  : Document content digest
+            ---
+            returns (dict) : Policy document, None if the document is not found
+        """
+
+        result = self.m_documents.get(digest)
+
+        if result is None and self.m_directory is not None :
+            filename = path.join(self.m_directory, 'documents', digest + '.json')
+            if path.isfile(filename) :
+                with open(filename, 'r', encoding='utf-8') as file :
+                    result = loads(file.read())
+                self.m_documents[digest] = result
+
+        return result
+
+    def store(self, key, digest, document) :
+        """ Write a document and its index entry in the cache directory
+            ---
+            key      (str)  : Policy arn and version
+            digest   (str)  : Document content digest
+            document (dict) : Policy document
+        """
+
+        filename = path.join(self.m_directory, 'documents', digest + '.json')
+        if not path.isfile(filename) :
+            with open(filename, 'w', encoding='utf-8') as file :
+                file.write(dumps(document, sort_keys = True))
+        with open(path.join(self.m_directory, 'index.jsonl'), 'a', encoding='utf-8') as file :
+            file.write(dumps({'key' : key, 'digest' : digest}) + '\n')
+
+# Policy documents shared by all the tools of the process
+POLICY_CACHE = PolicyDocumentCache()
+
+# Compiled documents, indexed by their normalized json content
+POLICY_DOCUMENTS = {}
+POLICY_DOCUMENTS_LOCK = Lock()
+
+def compile_policy(document) :
+    """ Return the compiled version of a policy document, compiling it on its first use
+        ---
+        document (dict) : Policy document, or its json string
+        ---
+        returns  (PolicyDocument) : Compiled policy
+    """
+
+    if isinstance(document, str) : document = loads(document)
+    key = dumps(document, sort_keys = True)
+
+    with POLICY_DOCUMENTS_LOCK :
+        if not key in POLICY_DOCUMENTS : POLICY_DOCUMENTS[key] = PolicyDocument(document)
+        result = POLICY_DOCUMENTS[key]
+
+    return result
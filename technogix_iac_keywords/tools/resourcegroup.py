@@ -35,18 +35,27 @@ class ResourceGroupTools(Tool) :
         if self.m_is_active['resource-groups'] :
             paginator = self.m_clients['resource-groups'].get_paginator('list_groups')
             group_iterator = paginator.paginate()
+            groups = []
             for response in group_iterator :
-                for group in response['Groups'] :
-                    group['Resources'] = []
-                    paginator2 = self.m_client.get_paginator('list_group_resources')
-                    resource_iterator = paginator2.paginate(Group = group['GroupArn'])
-                    for resource in resource_iterator :
-                        group['Resources'] = group['Resources'] + resource['Resources']
-
-                    result.append(group)
+                groups = groups + response['Groups']
+            result = self.parallelize(self.describe_group, groups)
 
         return result
 
+    def describe_group(self, group) :
+        """ Add resources to a resource group description
+            ---
+            group (dict) : Group, as returned by list_groups
+        """
+
+        group['Resources'] = []
+        paginator = self.m_clients['resource-groups'].get_paginator('list_group_resources')
+        resource_iterator = paginator.paginate(Group = group['GroupArn'])
+        for resource in resource_iterator :
+            group['Resources'] = group['Resources'] + resource['Resources']
+
+        return group
+
     def list_resources(self) :
         """ List all resources """
 
@@ -12,8 +12,15 @@
 
 # System includes
 from sys import path as syspath
-from os import path
+from os import path, walk, sep
 from json import loads, dumps
+from hashlib import md5, sha256
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Boto3 includes
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 
 # Robotframework includes
 from robot.api import logger
@@ -22,17 +29,98 @@ ROBOT = False
 # Local include
 syspath.append(path.normpath(path.join(path.dirname(__file__), './')))
 from tool import Tool
+from policy import compile_policy
+from inventory import Inventory
+from s3select import S3Select
+from bucketregion import BUCKET_REGIONS
 
-# pylint: disable=R0916, R0201, R0912, R0915, C0301, R1702
+# pylint: disable=R0916, R0201, R0912, R0915, C0301, R1702, R0904
 class S3Tools(Tool) :
     """ Class providing tools to check AWS S3 compliance """
 
+    # Bucket attributes that list_buckets can add, with the method retrieving them
+    s_bucket_attributes = {
+        'Rules'                             : 'fetch_lifecycle',
+        'Policy'                            : 'fetch_policy',
+        'ServerSideEncryptionConfiguration' : 'fetch_encryption',
+        'PublicAccessBlockConfiguration'    : 'fetch_public_access_block',
+        'Grants'                            : 'fetch_acl',
+        'PolicyStatus'                      : 'fetch_policy_status',
+        'Tags'                              : 'fetch_tags',
+        'LoggingEnabled'                    : 'fetch_logging',
+        'Versioning'                        : 'fetch_versioning'
+    }
+
+    # Size of the chunks read from objects streams
+    s_stream_chunk_size = 1024 * 1024
+
+    # Maximal number of objects deleted by a single request
+    s_delete_batch_size = 1000
+
     def __init__(self):
         """ Constructor """
         super().__init__()
         self.m_services.append('s3')
         self.m_services.append('macie')
 
+    def head_bucket(self, bucket) :
+        """ Test if a bucket is accessible, memorizing its region
+            ---
+            bucket   (str)  : Bucket to analyze
+            ---
+            returns  (bool) : True if bucket is accessible, False otherwise
+        """
+
+        result = False
+        headers = {}
+
+        try :
+            response = self.m_clients['s3'].head_bucket(Bucket=bucket)
+            headers = response['ResponseMetadata']['HTTPHeaders']
+            result = True
+        except ClientError as error :
+            # Even a denied or redirected request tells in which region the bucket is
+            if 'ResponseMetadata' in error.response and \
+                'HTTPHeaders' in error.response['ResponseMetadata'] :
+                headers = error.response['ResponseMetadata']['HTTPHeaders']
+        except Exception : result = False
+
+        if 'x-amz-bucket-region' in headers :
+            BUCKET_REGIONS.set(bucket, headers['x-amz-bucket-region'])
+
+        return result
+
+    def get_bucket_region(self, bucket) :
+        """ Returns the region in which a bucket is located
+            ---
+            bucket   (str) : Bucket to analyze
+            ---
+            returns  (str) : Bucket region, tool region if it can not be found
+        """
+
+        if not BUCKET_REGIONS.is_known(bucket) : self.head_bucket(bucket)
+
+        result = BUCKET_REGIONS.get(bucket, self.m_region)
+
+        return result
+
+    def get_bucket_client(self, bucket) :
+        """ Returns the s3 client of the region in which a bucket is located, so that the
+            bucket requests are not redirected
+            ---
+            bucket   (str)    : Bucket to analyze
+            ---
+            returns  (Client) : S3 client of the bucket region
+        """
+
+        result = self.m_clients['s3']
+
+        region = self.get_bucket_region(bucket)
+        if region != self.m_region : result = self.get_regional_client('s3', region)
+        BUCKET_REGIONS.track(result)
+
+        return result
+
     def upload_file(self, bucket, filename, s3object) :
         """ Upload file to an s3 bucket
             ---
@@ -42,7 +130,100 @@ class S3Tools(Tool) :
         """
 
         if self.m_is_active['s3'] :
-            self.m_clients['s3'].upload_file(filename, bucket, s3object)
+            self.get_bucket_client(bucket).upload_file(filename, bucket, s3object)
+
+    # pylint: disable=R0913, R0914
+    def upload_directory(self, bucket, directory, prefix = '', part_size = 8 * 1024 * 1024, \
+        concurrency = 10, skip_unchanged = False) :
+        """ Upload all the files of a directory to an s3 bucket, several files being uploaded
+            concurrently and large files being uploaded by parts
+            ---
+            bucket         (str)  : Bucket to update
+            directory      (str)  : Directory to upload
+            prefix         (str)  : Prefix to give to the files objects in bucket
+            part_size      (int)  : Size of the parts of a multipart upload, in bytes
+            concurrency    (int)  : Maximal number of parts of a file uploaded concurrently
+            skip_unchanged (bool) : True if the files which size and etag match the existing
+                                    object shall not be uploaded again
+            ---
+            returns        (list) : Objects that have been uploaded
+        """
+
+        result = []
+
+        if self.m_is_active['s3'] :
+            files = []
+            for root, _, names in walk(directory) :
+                for name in sorted(names) :
+                    filename = path.join(root, name)
+                    key = prefix + path.relpath(filename, directory).replace(sep, '/')
+                    files.append({'filename' : filename, 'key' : key})
+
+            # Existing objects are retrieved with a single listing of the prefix
+            existing = {}
+            if skip_unchanged :
+                for obj in self.iterate_objects(bucket, prefix = prefix) :
+                    existing[obj['Key']] = obj
+
+            config = TransferConfig(multipart_threshold = part_size, \
+                multipart_chunksize = part_size, max_concurrency = concurrency)
+            workers = max(1, self.get_max_workers() // concurrency)
+            uploaded = self.parallelize(partial(self.sync_file, bucket, existing = existing, \
+                config = config), files, max_workers = workers)
+            for key in uploaded :
+                if key is not None : result.append(key)
+
+        return result
+    # pylint: enable=R0913, R0914
+
+    def sync_file(self, bucket, file, existing, config) :
+        """ Upload a file to an s3 bucket, unless an identical object already exists
+            ---
+            bucket   (str)            : Bucket to update
+            file     (dict)           : Name of the file to upload and key of its object
+            existing (dict)           : Existing bucket objects, by key
+            config   (TransferConfig) : Transfer configuration to use
+            ---
+            returns  (str)            : Object key if the file was uploaded, None otherwise
+        """
+
+        result = file['key']
+
+        if file['key'] in existing :
+            obj = existing[file['key']]
+            if obj['Size'] == path.getsize(file['filename']) and \
+                obj['ETag'].strip('"') == self.compute_etag(file['filename'], config) :
+                result = None
+
+        if result is not None :
+            self.get_bucket_client(bucket).upload_file(file['filename'], bucket, file['key'], \
+                Config = config)
+
+        return result
+
+    def compute_etag(self, filename, config) :
+        """ Compute the etag s3 gives to a file uploaded with a transfer configuration.
+            Objects encrypted with kms keys have other etags, and are always uploaded again
+            ---
+            filename (str)            : File to analyze
+            config   (TransferConfig) : Transfer configuration used for the upload
+            ---
+            returns  (str)            : Expected object etag
+        """
+
+        digests = []
+        with open(filename, 'rb') as file :
+            chunk = file.read(config.multipart_chunksize)
+            while len(chunk) > 0 or len(digests) == 0 :
+                digests.append(md5(chunk).digest())
+                chunk = file.read(config.multipart_chunksize)
+
+        if path.getsize(filename) < config.multipart_threshold :
+            result = digests[0].hex()
+        else :
+            result = md5(b''.join(digests)).hexdigest() + '-' + str(len(digests))
+
+        return result
 
     def remove_object(self, bucket, s3object) :
         """ Remove an object from bucket if it exists
@@ -51,38 +232,82 @@ class S3Tools(Tool) :
             s3object (str) : Object to remove in bucket
         """
 
-        if self.m_is_active['s3'] :
-            paginator = self.m_clients['s3'].get_paginator('list_objects')
-            response_iterator = paginator.paginate(Bucket=bucket)
-            shall_continue = True
-            for response in response_iterator :
-                if shall_continue :
-                    if 'Contents' in response :
-                        for obj in response['Contents'] :
-                            if obj['Key'] == s3object :
-                                self.m_clients['s3'].delete_object(Bucket=bucket, Key=s3object)
-                                shall_continue = False
+        if self.object_exists(bucket, s3object) :
+            self.get_bucket_client(bucket).delete_object(Bucket=bucket, Key=s3object)
 
+    # pylint: disable=R0914
     def empty_bucket(self, bucket) :
-        """ Empty a bucket
+        """ Empty a bucket, deleting its objects versions and delete markers by batches of
+            1000 keys, the batches being deleted concurrently
             ---
-            bucket   (str) : Bucket to empty
+            bucket   (str)  : Bucket to empty
+            ---
+            returns  (list) : Objects that could not be deleted, with the associated error
         """
 
+        result = []
+
         if self.m_is_active['s3'] :
-            paginator = self.m_clients['s3'].get_paginator('list_object_versions')
+            client = self.get_bucket_client(bucket)
+            paginator = client.get_paginator('list_object_versions')
             response_iterator = paginator.paginate(Bucket=bucket)
-            for response in response_iterator :
-                if 'Versions' in response :
-                    for obj in response['Versions'] :
-                        key = obj['Key']
-                        vid = obj['VersionId']
-                        self.m_clients['s3'].delete_object(Bucket=bucket, Key=key, VersionId=vid)
-                if 'DeleteMarkers' in response :
-                    for obj in response['DeleteMarkers'] :
-                        key = obj['Key']
-                        vid = obj['VersionId']
-                        self.m_clients['s3'].delete_object(Bucket=bucket, Key=key, VersionId=vid)
+            workers = self.get_max_workers()
+            pending = set()
+            deleted = 0
+            with ThreadPoolExecutor(max_workers = workers) as executor :
+                for response in response_iterator :
+                    objects = []
+                    for obj in response.get('Versions', []) + response.get('DeleteMarkers', []) :
+                        objects.append({'Key' : obj['Key'], 'VersionId' : obj['VersionId']})
+                    for i_batch in range(0, len(objects), self.s_delete_batch_size) :
+                        batch = objects[i_batch:i_batch + self.s_delete_batch_size]
+                        pending.add(executor.submit(self.delete_objects, bucket, batch))
+
+                    # Do not list faster than objects are deleted
+                    while len(pending) >= 2 * workers :
+                        done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                        deleted = deleted + self.collect_deletions(done, result)
+                        logger.info(str(deleted) + ' objects deleted from bucket ' + bucket)
+
+                done, pending = wait(pending)
+                deleted = deleted + self.collect_deletions(done, result)
+                logger.info(str(deleted) + ' objects deleted from bucket ' + bucket)
+
+        return result
+    # pylint: enable=R0914
+
+    def delete_objects(self, bucket, objects) :
+        """ Delete a batch of objects versions
+            ---
+            bucket   (str)  : Bucket to update
+            objects  (list) : Objects to delete, as a list of Key and VersionId dictionaries
+            ---
+            returns  (dict) : Number of deleted objects and errors for the objects not deleted
+        """
+
+        response = self.get_bucket_client(bucket).delete_objects(Bucket = bucket, \
+            Delete = {'Objects' : objects, 'Quiet' : True})
+        errors = response.get('Errors', [])
+
+        return {'deleted' : len(objects) - len(errors), 'errors' : errors}
+
+    def collect_deletions(self, futures, errors) :
+        """ Gather the results of finished objects deletions
+            ---
+            futures  (set)  : Finished deletions
+            errors   (list) : List to append deletion errors to
+            ---
+            returns  (int)  : Number of deleted objects
+        """
+
+        result = 0
+
+        for future in futures :
+            response = future.result()
+            result = result + response['deleted']
+            errors.extend(response['errors'])
+
+        return result
 
     def remove_bucket(self, bucket) :
         """ Remove an existing bucket
@@ -90,105 +315,231 @@ class S3Tools(Tool) :
             bucket   (str) : Bucket to delete
         """
         if self.m_is_active['s3'] :
-            self.m_clients['s3'].delete_bucket(Bucket=bucket)
+            self.get_bucket_client(bucket).delete_bucket(Bucket=bucket)
+            # The bucket name may be reused for a bucket in another region
+            BUCKET_REGIONS.forget(bucket)
 
-    def list_buckets(self, account) :
+    def list_buckets(self, account, attributes = None, check_access = False) :
         """ List all buckets in that are accessible in environment
             ---
-            account   (str) : Account to analyze
+            account      (str)  : Account to analyze
+            attributes   (list) : Bucket attributes to retrieve, all if None. If no attribute
+                                  is requested, the buckets accessibility is only checked on
+                                  demand
+            check_access (bool) : True if the buckets accessibility shall be checked even if
+                                  no attribute is requested
             ---
-            returns  (list) : List of all the account buckets
+            returns      (list) : List of all the account buckets
         """
 
         result = []
 
+        if attributes is None : attributes = list(self.s_bucket_attributes.keys())
+
         if self.m_is_active['s3'] :
             response = self.m_clients['s3'].list_buckets()
-            for bkt in response['Buckets'] :
-                name = bkt['Name']
-                try :
-                    is_accessible = self.m_clients['s3'].head_bucket(Bucket=name)
-                except Exception : is_accessible = False
-                if is_accessible :
-                    try :
-                        lifecycle = self.m_clients['s3'].get_bucket_lifecycle_configuration(Bucket=name)
-                    except Exception : lifecycle = {'Rules' : []}
-                    bkt['Rules'] = lifecycle['Rules']
-                    try :
-                        policy = self.m_clients['s3'].get_bucket_policy(Bucket = name)
-                    except Exception : policy = {'Policy' : '{}'}
-                    bkt['Policy'] = loads(policy['Policy'])
-                    try :
-                        encryption = self.m_clients['s3'].get_bucket_encryption(Bucket = name)
-                    except Exception : encryption = {'ServerSideEncryptionConfiguration' : {}}
-                    bkt['ServerSideEncryptionConfiguration'] = \
-                        encryption['ServerSideEncryptionConfiguration']
-                    try :
-                        public = self.m_clients['s3'].get_public_access_block(Bucket = name, \
-                            ExpectedBucketOwner = account)
-                    except Exception : public = {'PublicAccessBlockConfiguration' : {}}
-                    bkt['PublicAccessBlockConfiguration'] = public['PublicAccessBlockConfiguration']
-                    try :
-                        acl = self.m_clients['s3'].get_bucket_acl(Bucket = name, \
-                            ExpectedBucketOwner = account)
-                    except Exception : acl = {'Grants' : {}}
-                    bkt['Grants'] = acl['Grants']
-                    try :
-                        public = self.m_clients['s3'].get_bucket_policy_status(Bucket = name, \
-                            ExpectedBucketOwner = account)
-                    except Exception : public = {'PolicyStatus' : {}}
-                    bkt['PolicyStatus'] = public['PolicyStatus']
-                    try :
-                        tags = self.m_clients['s3'].get_bucket_tagging(Bucket = name, \
-                            ExpectedBucketOwner = account)
-                    except Exception : tags = {'TagSet' : {}}
-                    bkt['Tags'] = tags['TagSet']
-                    try :
-                        log = self.m_clients['s3'].get_bucket_logging(Bucket = name, \
-                            ExpectedBucketOwner = account)
-                    except Exception : log = {'LoggingEnabled' : {}}
-                    if 'LoggingEnabled' in log : bkt['LoggingEnabled'] = log['LoggingEnabled']
-                    else : bkt['LoggingEnabled'] =  {}
-                    try :
-                        versioning = self.m_clients['s3'].get_bucket_versioning(Bucket = name, \
-                            ExpectedBucketOwner = account)
-                        versioning = {'Status' : versioning['Status'], 'MFADelete' : versioning['MFADelete']}
-                    except Exception : versioning = {}
-                    bkt['Versioning'] = versioning
-
-                    result.append(bkt)
+            if len(attributes) == 0 and not check_access :
+                result = response['Buckets']
+            else :
+                # Each bucket already performs its attributes requests concurrently
+                workers = max(1, self.get_max_workers() // max(1, len(attributes)))
+                buckets = self.parallelize(partial(self.describe_bucket, account = account, \
+                    attributes = attributes), response['Buckets'], max_workers = workers)
+                for bkt in buckets :
+                    if bkt is not None : result.append(bkt)
+
+        return result
+
+    def describe_bucket(self, bkt, account, attributes) :
+        """ Add the requested attributes to a bucket description
+            ---
+            bkt        (dict) : Bucket, as returned by list_buckets api
+            account    (str)  : Account in which the bucket is located
+            attributes (list) : Bucket attributes to retrieve
+            ---
+            returns    (dict) : Bucket with its attributes, None if bucket is not accessible
+        """
+
+        result = None
+
+        name = bkt['Name']
+        try :
+            is_accessible = self.head_bucket(name)
+        except Exception : is_accessible = False
+        if is_accessible :
+            fetchers = [getattr(self, self.s_bucket_attributes[attribute]) \
+                for attribute in attributes]
+            values = self.parallelize(lambda fetch : fetch(name, account), fetchers)
+            for value in values : bkt.update(value)
+            result = bkt
 
         return result
 
-    def list_objects(self, bucket, number, storage = None) :
+    def fetch_lifecycle(self, bucket, account) :
+        """ Returns bucket lifecycle rules, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            lifecycle = self.get_bucket_client(bucket).get_bucket_lifecycle_configuration(\
+                Bucket = bucket, ExpectedBucketOwner = account)
+        except Exception : lifecycle = {'Rules' : []}
+        return {'Rules' : lifecycle['Rules']}
+
+    def fetch_policy(self, bucket, account) :
+        """ Returns bucket policy, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            policy = self.get_bucket_client(bucket).get_bucket_policy(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : policy = {'Policy' : '{}'}
+        return {'Policy' : loads(policy['Policy'])}
+
+    def fetch_encryption(self, bucket, account) :
+        """ Returns bucket encryption configuration, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            encryption = self.get_bucket_client(bucket).get_bucket_encryption(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : encryption = {'ServerSideEncryptionConfiguration' : {}}
+        return {'ServerSideEncryptionConfiguration' : \
+            encryption['ServerSideEncryptionConfiguration']}
+
+    def fetch_public_access_block(self, bucket, account) :
+        """ Returns bucket public access configuration, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            public = self.get_bucket_client(bucket).get_public_access_block(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : public = {'PublicAccessBlockConfiguration' : {}}
+        return {'PublicAccessBlockConfiguration' : public['PublicAccessBlockConfiguration']}
+
+    def fetch_acl(self, bucket, account) :
+        """ Returns bucket access control list, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            acl = self.get_bucket_client(bucket).get_bucket_acl(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : acl = {'Grants' : {}}
+        return {'Grants' : acl['Grants']}
+
+    def fetch_policy_status(self, bucket, account) :
+        """ Returns bucket policy status, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            public = self.get_bucket_client(bucket).get_bucket_policy_status(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : public = {'PolicyStatus' : {}}
+        return {'PolicyStatus' : public['PolicyStatus']}
+
+    def fetch_tags(self, bucket, account) :
+        """ Returns bucket tags, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            tags = self.get_bucket_client(bucket).get_bucket_tagging(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : tags = {'TagSet' : {}}
+        return {'Tags' : tags['TagSet']}
+
+    def fetch_logging(self, bucket, account) :
+        """ Returns bucket access logging configuration, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            log = self.get_bucket_client(bucket).get_bucket_logging(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+        except Exception : log = {'LoggingEnabled' : {}}
+        if 'LoggingEnabled' in log : result = {'LoggingEnabled' : log['LoggingEnabled']}
+        else : result = {'LoggingEnabled' : {}}
+        return result
+
+    def fetch_versioning(self, bucket, account) :
+        """ Returns bucket versioning configuration, empty if none
+            ---
+            bucket  (str)  : Bucket to analyze
+            account (str)  : Account in which the bucket is located
+        """
+        try :
+            versioning = self.get_bucket_client(bucket).get_bucket_versioning(Bucket = bucket, \
+                ExpectedBucketOwner = account)
+            versioning = {'Status' : versioning['Status'], 'MFADelete' : versioning['MFADelete']}
+        except Exception : versioning = {}
+        return {'Versioning' : versioning}
+
+    def list_objects(self, bucket, number, storage = None, prefix = None) :
         """ List all objects in bucket
             ---
             bucket   (str)  : Bucket to analyze
             number   (int)  : Maximal number of object to retrieve in bucket
             storage  (str)  : Searched objects storage class (default = None)
+            prefix   (str)  : Prefix of the searched objects (default = None)
             ---
             returns  (list) : List of the n first bucket objects
         """
 
         result = []
 
-        if self.m_is_active['s3'] :
-            paginator = self.m_clients['s3'].get_paginator('list_objects')
-            response_iterator = paginator.paginate(Bucket=bucket)
-            shall_continue = True
-            for response in response_iterator :
-                if shall_continue :
-                    if 'Contents' in response :
-                        for obj in response['Contents'] :
-                            if len(result) < number :
-                                if obj["Size"] != 0 and \
-                                    (storage is None or obj["StorageClass"] == storage) :
-                                    result.append(obj)
-
-                            else : shall_continue = False
+        if int(number) > 0 :
+            for obj in self.iterate_objects(bucket, prefix = prefix) :
+                if obj["Size"] != 0 and (storage is None or obj["StorageClass"] == storage) :
+                    result.append(obj)
+                # Stop fetching pages as soon as enough objects have been found
+                if len(result) >= int(number) : break
 
         return result
 
+    def iterate_objects(self, bucket, prefix = None, start_after = None, max_keys = None) :
+        """ Iterate over the objects of a bucket, the next page of objects being only
+            requested when the previous one has been consumed
+            ---
+            bucket      (str)  : Bucket to analyze
+            prefix      (str)  : Prefix of the objects to list (default = None)
+            start_after (str)  : Key after which the listing shall start (default = None)
+            max_keys    (int)  : Maximal number of objects to list, all if None
+            ---
+            yields      (dict) : Bucket objects, in keys order
+        """
+
+        if self.m_is_active['s3'] :
+            client = self.get_bucket_client(bucket)
+            parameters = {'Bucket' : bucket}
+            if prefix is not None       : parameters['Prefix'] = prefix
+            if start_after is not None  : parameters['StartAfter'] = start_after
+            remaining = None
+            if max_keys is not None     : remaining = int(max_keys)
+
+            shall_continue = (remaining is None or remaining > 0)
+            while shall_continue :
+                if remaining is not None : parameters['MaxKeys'] = min(remaining, 1000)
+                response = client.list_objects_v2(**parameters)
+                contents = response.get('Contents', [])
+                yield from contents
+                if remaining is not None : remaining = remaining - len(contents)
+                if response.get('IsTruncated', False) and (remaining is None or remaining > 0) :
+                    parameters['ContinuationToken'] = response['NextContinuationToken']
+                else : shall_continue = False
+
 
     def object_exists(self, bucket, s3object) :
         """ Test if a file exists in bucket
@@ -202,12 +553,36 @@ class S3Tools(Tool) :
         result = False
 
         if self.m_is_active['s3'] :
-            paginator = self.m_clients['s3'].get_paginator('list_objects')
-            response_iterator = paginator.paginate(Bucket=bucket, Prefix=s3object)
-            for response in response_iterator :
-                if 'Contents' in response :
-                    for obj in response['Contents'] :
-                        if obj['Key'] == s3object : result = True
+            try :
+                self.get_bucket_client(bucket).head_object(Bucket=bucket, Key=s3object)
+                result = True
+            except ClientError as error :
+                if not error.response['Error']['Code'] in ['404', 'NoSuchKey', 'NotFound'] :
+                    raise
+
+        return result
+
+    def list_missing_objects(self, bucket, s3objects) :
+        """ Look for a list of objects in bucket, using a single listing of the objects
+            sharing their common prefix
+            ---
+            bucket    (str)  : Bucket to analyze
+            s3objects (list) : Objects to look for in bucket
+            ---
+            returns   (list) : Objects not found in bucket, in the provided order
+        """
+
+        result = []
+
+        if self.m_is_active['s3'] :
+            searched = set(s3objects)
+            found = set()
+            if len(searched) > 0 :
+                for obj in self.iterate_objects(bucket, prefix = path.commonprefix(list(searched))) :
+                    if obj['Key'] in searched : found.add(obj['Key'])
+                    if len(found) == len(searched) : break
+            for s3object in s3objects :
+                if not s3object in found : result.append(s3object)
 
         return result
 
@@ -222,8 +597,8 @@ class S3Tools(Tool) :
 
         result = False
 
-        result = self.list_buckets(account)
-        for bkt in result :
+        buckets = self.list_buckets(account, [])
+        for bkt in buckets :
             if bkt['Name'] == bucket : result = True
 
         return result
@@ -239,7 +614,7 @@ class S3Tools(Tool) :
 
         try :
             if self.m_is_active['s3'] :
-                is_accessible = self.m_clients['s3'].head_bucket(Bucket=bucket)
+                is_accessible = self.get_bucket_client(bucket).head_bucket(Bucket=bucket)
                 logger.info(dumps(is_accessible))
             result = True
         except Exception : result = False
@@ -259,35 +634,167 @@ class S3Tools(Tool) :
 
 
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_bucket_encryption(Bucket = bucket, \
+            response = self.get_bucket_client(bucket).get_bucket_encryption(Bucket = bucket, \
                 ExpectedBucketOwner = account)
             if 'ServerSideEncryptionConfiguration' in response :
-                for rule in response['ServerSideEncryptionConfiguration'] ['Rules']:
-                    if 'ApplyServerSideEncryptionByDefault' in rule :
-                        if  rule['ApplyServerSideEncryptionByDefault']['SSEAlgorithm'] == 'AES256' or \
-                            rule['ApplyServerSideEncryptionByDefault']['SSEAlgorithm'] == 'aws:kms' :
-                            result = True
+                result = self.is_encryption_enabled(response['ServerSideEncryptionConfiguration'])
 
         return result
 
-    def object_can_be_downloaded(self, bucket, s3object) :
-        """ Test if an object can be downloaded by user
+    def is_encryption_enabled(self, configuration) :
+        """ Test if a bucket encryption configuration enables encryption by default
+            ---
+            configuration (dict) : Server side encryption configuration to analyze
+            ---
+            returns       (bool) : True if bucket is encrypted, False otherwise
+        """
+
+        result = False
+
+        if 'Rules' in configuration :
+            for rule in configuration['Rules']:
+                if 'ApplyServerSideEncryptionByDefault' in rule :
+                    if  rule['ApplyServerSideEncryptionByDefault']['SSEAlgorithm'] == 'AES256' or \
+                        rule['ApplyServerSideEncryptionByDefault']['SSEAlgorithm'] == 'aws:kms' :
+                        result = True
+
+        return result
+
+    def object_can_be_downloaded(self, bucket, s3object, mode = 'range') :
+        """ Test if an object can be downloaded by user, without transferring its content
             ---
             bucket   (str)  : Bucket to analyze
             s3object (str)  : Object to download
+            mode     (str)  : 'range' to download the object first byte, 'head' to only
+                              retrieve the object metadata
             ---
             returns  (bool) : True if object can be downloaded by user, False otherwise
         """
         result = False
 
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_object(Bucket = bucket, Key = s3object)
-            if 'LastModified 'in response : del response['LastModified']
-            if 'Expires' in response : del response['Expires']
-            if 'ObjectLockRetainUntilDate' in response : del response['ObjectLockRetainUntilDate']
-            del response['Body']
-            logger.info(response['ContentLength'])
-            if response['ContentLength'] != 0 : result = True
+            client = self.get_bucket_client(bucket)
+            if mode == 'head' :
+                response = client.head_object(Bucket = bucket, Key = s3object)
+                size = response['ContentLength']
+            else :
+                try :
+                    response = client.get_object(Bucket = bucket, Key = s3object, Range = 'bytes=0-0')
+                    # Consume and release the stream, so that its connection goes back to the pool
+                    response['Body'].read()
+                    response['Body'].close()
+                    if 'ContentRange' in response :
+                        size = int(response['ContentRange'].split('/')[-1])
+                    else : size = response['ContentLength']
+                except ClientError as error :
+                    # Empty objects have no first byte to download
+                    if error.response['Error']['Code'] != 'InvalidRange' : raise
+                    size = 0
+            logger.info(size)
+            if size != 0 : result = True
+
+        return result
+
+    def object_matches_file(self, bucket, s3object, filename, part_size = 8 * 1024 * 1024) :
+        """ Test if an object content is identical to a local file, comparing the digests of
+            object parts downloaded concurrently with the matching file parts. The object is
+            streamed, so that memory does not depend on the object size
+            ---
+            bucket    (str)  : Bucket to analyze
+            s3object  (str)  : Object to compare
+            filename  (str)  : Local file to compare object to
+            part_size (int)  : Size of the parts compared concurrently, in bytes
+            ---
+            returns   (bool) : True if object and file are identical, False otherwise
+        """
+
+        result = False
+
+        if self.m_is_active['s3'] :
+            response = self.get_bucket_client(bucket).head_object(Bucket = bucket, Key = s3object)
+            size = path.getsize(filename)
+            if response['ContentLength'] == size :
+                parts = []
+                for start in range(0, size, part_size) :
+                    parts.append({'start' : start, 'end' : min(start + part_size, size) - 1})
+                matches = self.parallelize(partial(self.part_matches_file, bucket, s3object, \
+                    filename), parts)
+                result = all(matches)
+
+        return result
+
+    def part_matches_file(self, bucket, s3object, filename, part) :
+        """ Test if an object part is identical to the same part of a local file
+            ---
+            bucket    (str)  : Bucket to analyze
+            s3object  (str)  : Object to compare
+            filename  (str)  : Local file to compare object to
+            part      (dict) : First and last bytes of the part to compare
+            ---
+            returns   (bool) : True if both parts are identical, False otherwise
+        """
+
+        remote = sha256()
+        local = sha256()
+
+        response = self.get_bucket_client(bucket).get_object(Bucket = bucket, Key = s3object, \
+            Range = 'bytes=' + str(part['start']) + '-' + str(part['end']))
+        try :
+            for chunk in response['Body'].iter_chunks(self.s_stream_chunk_size) :
+                remote.update(chunk)
+        finally :
+            response['Body'].close()
+
+        with open(filename, 'rb') as file :
+            file.seek(part['start'])
+            remaining = part['end'] - part['start'] + 1
+            while remaining > 0 :
+                chunk = file.read(min(remaining, self.s_stream_chunk_size))
+                if len(chunk) == 0 : remaining = 0
+                else : remaining = remaining - len(chunk)
+                local.update(chunk)
+
+        return remote.digest() == local.digest()
+
+    def get_select(self, bucket) :
+        """ Return the S3 Select queries on the objects of a bucket
+            ---
+            bucket  (str)      : Bucket to query
+            ---
+            returns (S3Select) : S3 Select queries addressing the bucket region
+        """
+        return S3Select(self.get_bucket_client(bucket), bucket)
+
+    def audit_inventory(self, bucket, prefix, checks, number = 10) :
+        """ Check all the objects of the latest inventory delivered in a location, the inventory
+            files being read concurrently
+            ---
+            bucket  (str)  : Inventory destination bucket
+            prefix  (str)  : Inventory location, ending with the inventory configuration id
+            checks  (dict) : Allowed StorageClass and EncryptionStatus lists, MinSize and MaxSize
+            number  (int)  : Maximal number of non compliant objects to return
+            ---
+            returns (dict) : Number of objects, number of non compliant objects and the first
+                             non compliant objects
+        """
+
+        result = {'objects' : 0, 'violations' : 0, 'examples' : []}
+
+        if self.m_is_active['s3'] :
+            inventory = Inventory(self.get_bucket_client(bucket), bucket)
+            key = inventory.find_manifest(prefix)
+            if key is None : raise Exception('No inventory found in ' + bucket + '/' + prefix)
+            logger.info('Auditing inventory ' + key)
+            manifest = inventory.read_manifest(key)
+
+            files = [file['key'] for file in manifest['files']]
+            audits = self.parallelize(partial(inventory.audit_file, manifest, checks, number), \
+                files)
+            for audit in audits :
+                result['objects'] = result['objects'] + audit['objects']
+                result['violations'] = result['violations'] + audit['violations']
+                result['examples'] = result['examples'] + audit['examples']
+            result['examples'] = result['examples'][:int(number)]
 
         return result
 
@@ -304,10 +811,24 @@ class S3Tools(Tool) :
 
 
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_bucket_versioning(Bucket = bucket, \
+            response = self.get_bucket_client(bucket).get_bucket_versioning(Bucket = bucket, \
                 ExpectedBucketOwner = account)
-            if  'Status' in response and response['Status'] == 'Enabled' and \
-                'MFADelete' in response and response['MFADelete'] == 'Enabled' : result = True
+            result = self.is_mfa_delete_enabled(response)
+
+        return result
+
+    def is_mfa_delete_enabled(self, versioning) :
+        """ Test if a bucket versioning configuration requires MFA for deletion
+            ---
+            versioning (dict) : Bucket versioning configuration to analyze
+            ---
+            returns    (bool) : True if MFA is required, False otherwise
+        """
+
+        result = False
+
+        if  'Status' in versioning and versioning['Status'] == 'Enabled' and \
+            'MFADelete' in versioning and versioning['MFADelete'] == 'Enabled' : result = True
 
         return result
 
@@ -322,7 +843,7 @@ class S3Tools(Tool) :
 
         result = []
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_bucket_acl(Bucket = bucket, \
+            response = self.get_bucket_client(bucket).get_bucket_acl(Bucket = bucket, \
                 ExpectedBucketOwner = account)
             logger.debug(response)
             result = response['Grants']
@@ -341,7 +862,7 @@ class S3Tools(Tool) :
         result = {}
 
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_bucket_policy(Bucket = bucket, \
+            response = self.get_bucket_client(bucket).get_bucket_policy(Bucket = bucket, \
                 ExpectedBucketOwner = account)
             result = loads(response['Policy'])
 
@@ -359,7 +880,7 @@ class S3Tools(Tool) :
         result = {}
 
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_public_access_block(Bucket = bucket, \
+            response = self.get_bucket_client(bucket).get_public_access_block(Bucket = bucket, \
                 ExpectedBucketOwner = account)
             result = response['PublicAccessBlockConfiguration']
 
@@ -377,82 +898,74 @@ class S3Tools(Tool) :
         result = {}
 
         if self.m_is_active['s3'] :
-            response = self.m_clients['s3'].get_bucket_logging(Bucket = bucket, \
+            response = self.get_bucket_client(bucket).get_bucket_logging(Bucket = bucket, \
                 ExpectedBucketOwner = account)
             if 'LoggingEnabled' in response :   result =  response['LoggingEnabled']
 
         return result
 
-    def ensure_macie_is_activated(self, bucket, account) :
+    def ensure_macie_is_activated(self, bucket, account, classifications = None) :
         """ Returns bucket macie analysis configuration
             ---
-            bucket  (str)  : Bucket to analyze
-            account (str)  : Account in which the bucket is located
+            bucket          (str)  : Bucket to analyze
+            account         (str)  : Account in which the bucket is located
+            classifications (dict) : Macie classifications indexed by bucket, as returned by
+                                     list_macie_classifications, retrieved if None
             ---
-            returns (bool) : True if the bucket is analyzed by macie, False otherwise
+            returns         (bool) : True if the bucket is analyzed by macie, False otherwise
         """
 
         result = False
 
+        if classifications is None : classifications = self.list_macie_classifications(account)
+        if bucket in classifications :
+            classification = classifications[bucket]
+            if 'continuous' in classification and classification['continuous'] == 'FULL' :
+                result = True
+
+        return result
+
+    def list_macie_classifications(self, account) :
+        """ Retrieve the macie classification of all the account buckets
+            ---
+            account (str)  : Account in which the buckets are located
+            ---
+            returns (dict) : Classification types, indexed by bucket name
+        """
+
+        result = {}
+
         if self.m_is_active['macie'] :
-            response = self.m_clients['macie'].list_s3_resources( memberAccountId=account )
-            for bkt in response['s3Resources'] :
-                if  bkt['bucketName'] == bucket and \
-                    'continuous' in bkt['classificationType'] and \
-                    bkt['classificationType']['continuous'] == 'FULL' :
-                    result = True
+            parameters = {'memberAccountId' : account}
+            shall_continue = True
+            while shall_continue :
+                response = self.m_clients['macie'].list_s3_resources(**parameters)
+                for bkt in response['s3Resources'] :
+                    classification = result.setdefault(bkt['bucketName'], {})
+                    # A bucket may be classified for several prefixes : a full continuous
+                    # classification on any of them is kept
+                    if classification.get('continuous') != 'FULL' :
+                        result[bkt['bucketName']] = bkt['classificationType']
+                if response.get('nextToken') :
+                    parameters['nextToken'] = response['nextToken']
+                else : shall_continue = False
 
         return result
 
     def is_preventing_unencrypted_put(self, policy) :
-
-        """ Returns policy TLS enforcement
+        """ Returns policy encryption enforcement
             ---
             policy  (dict) : Policy to analyze
             ---
-            returns (bool) : True if the policy allows only https access, False otherwise
+            returns (bool) : True if the policy allows only encrypted https puts, False otherwise
         """
-        result1 = self.is_preventing_http_access(policy)
-
-        result2 = False
-        content = policy['Statement']
-        if isinstance(content,str) :
-            if content['Effect'] == 'Deny' :
-                if  (   'Action' in content and
-                        (   (isinstance(content['Action'],str) and
-                                (   content['Action'] == '*' or
-                                    content['Action'] == "s3:*" or
-                                    content['Action'] == "s3:PutObject")) or \
-                            (isinstance(content['Action'],list) and
-                                (   '*' in content['Action'] or
-                                    's3:*' in content['Action'] or
-                                    's3:PutObject' in content['Action'])))) and \
-                    (   'Condition' in content and
-                        'Null' in content['Condition'] and
-                        's3:x-amz-server-side-encryption' in content['Condition']['Null'] and
-                        content['Condition']['Bool']['s3:x-amz-server-side-encryption'] == 'true') :
-                    result2 = True
-        elif isinstance(content,list) :
-            for statement in content :
-                print(dumps(statement))
-                if statement['Effect'] == 'Deny' :
-                    if  (   'Action' in statement and
-                            (   (isinstance(statement['Action'],str) and
-                                    (   statement['Action'] == '*' or
-                                        statement['Action'] == "s3:*" or
-                                        statement['Action'] == "s3:PutObject")) or \
-                                (isinstance(statement['Action'],list) and
-                                    (   '*' in statement['Action'] or
-                                        's3:*' in statement['Action']or
-                                        's3:PutObject' in statement['Action'])))) and \
-                        (   'Condition' in statement and
-                            'Null' in statement['Condition'] and
-                            's3:x-amz-server-side-encryption' in statement['Condition']['Null'] and
-                            statement['Condition']['Null']['s3:x-amz-server-side-encryption'] == 'true') :
-                        result2 = True
-
-        return result1 and result2
 
+        result = self.is_preventing_http_access(policy)
+        if result :
+            result = compile_policy(policy).denies_when('s3:PutObject', 'Null', \
+                's3:x-amz-server-side-encryption', 'true')
+
+        return result
 
     def is_preventing_http_access(self, policy) :
         """ Returns policy TLS enforcement
@@ -461,88 +974,15 @@ class S3Tools(Tool) :
             ---
             returns (bool) : True if the policy allows only https access, False otherwise
         """
-
-        result = False
-        content = policy['Statement']
-        if isinstance(content,str) :
-            if content['Effect'] == 'Deny' :
-                if  (   'Action' in content and
-                        (   (isinstance(content['Action'],str) and
-                                (   content['Action'] == '*' or
-                                    content['Action'] == "s3:*")) or \
-                            (isinstance(content['Action'],list) and
-                                (   '*' in content['Action'] or
-                                    's3:*' in content['Action'])))) and \
-                    (   'Condition' in content and
-                        'Bool' in content['Condition'] and
-                        'aws:SecureTransport' in content['Condition']['Bool'] and
-                        content['Condition']['Bool']['aws:SecureTransport'] == 'false') :
-                    result = True
-        elif isinstance(content,list) :
-            for statement in content :
-                print(dumps(statement))
-                if statement['Effect'] == 'Deny' :
-                    if  (   'Action' in statement and
-                            (   (isinstance(statement['Action'],str) and
-                                    (   statement['Action'] == '*' or
-                                        statement['Action'] == "s3:*")) or \
-                                (isinstance(statement['Action'],list) and
-                                    (   '*' in statement['Action'] or
-                                        's3:*' in statement['Action'])))) and \
-                        (   'Condition' in statement and
-                            'Bool' in statement['Condition'] and
-                            'aws:SecureTransport' in statement['Condition']['Bool'] and
-                            statement['Condition']['Bool']['aws:SecureTransport'] == 'false') :
-                        result = True
-
-        return result
-
+        return compile_policy(policy).denies_when('s3:*', 'Bool', 'aws:SecureTransport', 'false')
 
     def is_preventing_anonymous_access(self, policy) :
         """ Returns policy anonymous access status
             ---
             policy  (dict) : Policy to analyze
             ---
-            returns (bool) : True if the policy allows anonymous access, False otherwise
-        """
-
-        result = True
-        logger.info(dumps(policy))
-        if isinstance(policy,dict) : logger.info('is dict')
-        logger.info(str(type(policy)))
-        content = policy['Statement']
-        logger.info(dumps(content))
-        if isinstance(content,str) :
-            if content['Effect'] == 'Allow' :
-                if  (   'Principal' in content and
-                        (   (isinstance(content['Principal'],str) and \
-                                content['Principal'] == '*') or \
-                            (isinstance(content['Principal'],dict) and \
-                                'AWS' in content['Principal'] and \
-                                isinstance(content['Principal']['AWS'],str) \
-                                and content['Principal']['AWS'] == "*")) or \
-                        (isinstance(content['Principal'],dict) and \
-                            'AWS' in content['Principal'] and \
-                            isinstance(content['Principal']['AWS'],list) and \
-                            '*' in content['Principal']['AWS'])) :
-                    result = False
-        elif isinstance(content,list) :
-            for statement in content :
-                logger.info(dumps(statement))
-                if statement['Effect'] == 'Allow' :
-                    if  (   'Principal' in statement and
-                        (   (isinstance(statement['Principal'],str) and \
-                            statement['Principal'] == '*') or \
-                        (isinstance(statement['Principal'],dict) and \
-                            'AWS' in statement['Principal'] and \
-                            isinstance(statement['Principal']['AWS'],str) and \
-                            statement['Principal']['AWS'] == "*")) or \
-                        (isinstance(statement['Principal'],dict) and \
-                            'AWS' in statement['Principal'] and \
-                            isinstance(statement['Principal']['AWS'],list) and \
-                            '*' in statement['Principal']['AWS'])) :
-                        result = False
-
-        return result
+            returns (bool) : True if the policy forbids anonymous access, False otherwise
+        """
+        return not compile_policy(policy).allows_public_access()
 
-# pylint: enable=R0916, R0201, R0912, R0915, C0301, R1702
+# pylint: enable=R0916, R0201, R0912, R0915, C0301, R1702, R0904
@@ -0,0 +1,119 @@
+""" -----------------------------------------------------
+# TECHNOGIX
+# -------------------------------------------------------
+# Copyright (c) [2022] Technogix SARL
+# All rights reserved
+# -------------------------------------------------------
+# Tool functions to query s3 objects content with S3 Select
+# -------------------------------------------------------
+# Nadège LEMPERIERE, @18 october 2026
+# Latest revision: 18 october 2026
+# --------------------------------------------------- """
+
+# System includes
+from json import loads
+
+# Robotframework includes
+from robot.api import logger
+ROBOT = False
+
+# Input serialization of the object formats S3 Select can query
+SELECT_FORMATS = {
+    'CSV'       : {'CSV' : {'FileHeaderInfo' : 'USE'}},
+    'JSON'      : {'JSON' : {'Type' : 'LINES'}},
+    'PARQUET'   : {'Parquet' : {}}
+}
+
+class S3Select :
+    """ Class querying the content of the objects of a bucket with S3 Select """
+
+    def __init__(self, client, bucket):
+        """ Constructor
+            ---
+            client (Client) : S3 client addressing the bucket region
+            bucket (str)    : Bucket to query
+        """
+        self.m_client = client
+        self.m_bucket = bucket
+
+    def iterate_records(self, s3object, expression, input_format = 'CSV', compression = 'NONE') :
+        """ Run an S3 Select query on an object, and iterate over the records it returns as they
+            are streamed, so that memory does not depend on the object size
+            ---
+            s3object     (str)  : Object to query
+            expression   (str)  : S3 Select SQL expression, querying the S3Object table
+            input_format (str)  : Object format : CSV (with header line), JSON (one document
+                                  per line) or PARQUET
+            compression  (str)  : Object compression : NONE, GZIP or BZIP2
+            ---
+            yields       (dict) : Records selected by the query, in object order
+        """
+
+        serialization = dict(SELECT_FORMATS[input_format.upper()])
+        if input_format.upper() != 'PARQUET' : serialization['CompressionType'] = compression
+
+        response = self.m_client.select_object_content(\
+            Bucket = self.m_bucket, Key = s3object, Expression = expression, \
+            ExpressionType = 'SQL', InputSerialization = serialization, \
+            OutputSerialization = {'JSON' : {'RecordDelimiter' : '\n'}})
+
+        # Events split the records stream at any byte : incomplete lines are kept until
+        # the next event completes them
+        is_complete = False
+        remaining = b''
+        try :
+            for event in response['Payload'] :
+                if 'Records' in event :
+                    lines = (remaining + event['Records']['Payload']).split(b'\n')
+                    remaining = lines.pop()
+                    for line in lines :
+                        if len(line) > 0 : yield loads(line.decode('utf-8'))
+                elif 'Stats' in event :
+                    logger.debug('S3 Select scanned ' + \
+                        str(event['Stats']['Details']['BytesScanned']) + ' bytes')
+                elif 'End' in event : is_complete = True
+        finally :
+            response['Payload'].close()
+
+        if len(remaining) > 0 : yield loads(remaining.decode('utf-8'))
+        if not is_complete : raise Exception('S3 Select stream ended before completion')
+
+    def count_records(self, s3object, condition = None, input_format = 'CSV', \
+        compression = 'NONE') :
+        """ Count the records of an object, the count being computed by S3 Select
+            ---
+            s3object     (str) : Object to query
+            condition    (str) : S3 Select WHERE clause on the s alias, all records if None
+            input_format (str) : Object format : CSV, JSON or PARQUET
+            compression  (str) : Object compression : NONE, GZIP or BZIP2
+            ---
+            returns      (int) : Number of records matching the condition
+        """
+
+        result = 0
+
+        expression = 'SELECT COUNT(*) FROM S3Object s'
+        if condition is not None : expression = expression + ' WHERE ' + condition
+        for record in self.iterate_records(s3object, expression, input_format, compression) :
+            result = result + int(record['_1'])
+
+        return result
+
+    def find_record(self, s3object, condition, input_format = 'CSV', compression = 'NONE') :
+        """ Look for the first record of an object matching a condition
+            ---
+            s3object     (str)  : Object to query
+            condition    (str)  : S3 Select WHERE clause on the s alias
+            input_format (str)  : Object format : CSV, JSON or PARQUET
+            compression  (str)  : Object compression : NONE, GZIP or BZIP2
+            ---
+            returns      (dict) : First matching record, None if no record matches
+        """
+
+        result = None
+
+        expression = 'SELECT * FROM S3Object s WHERE ' + condition + ' LIMIT 1'
+        for record in self.iterate_records(s3object, expression, input_format, compression) :
+            if result is None : result = record
+
+        return result
@@ -22,6 +22,7 @@ ROBOT = False
 # Local include
 syspath.append(path.normpath(path.join(path.dirname(__file__), './')))
 from tool import Tool
+from policy import compile_policy
 
 class SNSTools(Tool) :
     """ Class providing tools to check AWS SNS compliance """
@@ -78,23 +79,26 @@ class SNSTools(Tool) :
         if self.m_is_active['sns'] :
             paginator = self.m_clients['sns'].get_paginator('list_topics')
             response_iterator = paginator.paginate()
+            topics = []
             for response in response_iterator :
-                for topic in response['Topics'] :
-                    attributes = self.m_clients['sns'].get_topic_attributes(\
-                        TopicArn = topic['TopicArn'])
-                    topic['Attributes'] = attributes['Attributes']
-                    if 'Policy' in topic['Attributes'] :
-                        topic['Attributes']['Policy'] = loads(topic['Attributes']['Policy'])
-                    if 'EffectiveDeliveryPolicy' in topic['Attributes'] :
-                        topic['Attributes']['EffectiveDeliveryPolicy'] = \
-                            loads(topic['Attributes']['EffectiveDeliveryPolicy'])
-                    if 'DeliveryPolicy' in topic['Attributes'] :
-                        topic['Attributes']['DeliveryPolicy'] = \
-                            loads(topic['Attributes']['DeliveryPolicy'])
-                    result.append(topic)
+                topics = topics + response['Topics']
+            result = self.parallelize(self.describe_topic, topics)
 
         return result
 
+    def describe_topic(self, topic) :
+        """ Add attributes to a topic description
+            ---
+            topic (dict) : Topic, as returned by list_topics
+            ---
+            returns (dict)  : Topic with its attributes
+        """
+
+        attributes = self.get_topic(topic['TopicArn'])
+        topic['Attributes'] = attributes['Attributes']
+
+        return topic
+
 
     def get_topic(self, arn) :
         """ Return a given topic
@@ -119,3 +123,18 @@ class SNSTools(Tool) :
                     loads(topic['Attributes']['DeliveryPolicy'])
 
         return topic
+
+    def is_topic_public(self, topic) :
+        """ Test if a topic policy allows everyone to perform an action on the topic
+            ---
+            topic   (dict) : Topic to analyze, as returned by list_topics
+            ---
+            returns (bool) : True if the topic policy allows public access, False otherwise
+        """
+
+        result = False
+
+        if 'Policy' in topic['Attributes'] :
+            result = compile_policy(topic['Attributes']['Policy']).allows_public_access()
+
+        return result
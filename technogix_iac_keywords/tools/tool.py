@@ -11,21 +11,249 @@
 # --------------------------------------------------- """
 
 # System includes
-from json import dumps
+from os import path
+from json import load, dump
+from time import sleep, monotonic
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Boto3 includes
 from boto3 import Session
+from botocore import __version__ as botocore_version
+from botocore.config import Config
+from botocore.session import get_session as get_botocore_session
 
 # Robotframework includes
 from robot.api import logger
 ROBOT = False
 
+class ClientPool :
+    """ Class sharing aws sessions and clients between all the tools of the process """
+
+    def __init__(self):
+        """ Constructor """
+        self.m_lock = Lock()
+        self.m_loader = None
+        self.m_sessions = {}
+        self.m_clients = {}
+        self.m_config = None
+        self.m_max_workers = None
+        self.configure()
+
+    # pylint: disable=R0913
+    def configure(self, max_pool_connections = 50, retry_mode = 'adaptive', max_attempts = 10, \
+        connect_timeout = 10, read_timeout = 60, tcp_keepalive = None) :
+        """ Set the performance profile used by all the clients created afterwards
+            ---
+            max_pool_connections (int)   : Maximal number of connections kept in a client pool
+            retry_mode           (str)   : Botocore retry mode (legacy, standard or adaptive)
+            max_attempts         (int)   : Maximal number of attempts for a request
+            connect_timeout      (float) : Connection timeout in seconds
+            read_timeout         (float) : Read timeout in seconds
+            tcp_keepalive        (bool)  : Enable tcp keepalive, botocore default if None
+        """
+
+        settings = {
+            'max_pool_connections'  : max_pool_connections,
+            'retries'               : {'mode' : retry_mode, 'max_attempts' : max_attempts},
+            'connect_timeout'       : connect_timeout,
+            'read_timeout'          : read_timeout
+        }
+        if tcp_keepalive is not None : settings['tcp_keepalive'] = tcp_keepalive
+
+        with self.m_lock :
+            self.m_config = Config(**settings)
+            self.m_max_workers = max_pool_connections
+            # Clients already created keep their configuration, the new ones shall use the
+            # new profile
+            self.m_clients = {}
+    # pylint: enable=R0913
+
+    def get_max_workers(self) :
+        """ Returns the maximal number of requests a client can perform in parallel
+            ---
+            returns (int) : Size of the clients connection pool
+        """
+        return self.m_max_workers
+
+    def get_session(self, profile, access_key, secret_key) :
+        """ Returns the session associated to a set of credentials, creating it if needed
+            Profile or access_key/secret_key shall be provided
+            ---
+            profile    (str) : AWS cli profile for SSO users authentication in aws
+            access_key (str) : Access key for IAM users authentication in aws
+            secret_key (str) : Secret key associated to the previous access key
+            ---
+            returns (Session) : Session shared by all tools using those credentials
+        """
+
+        key = (profile, access_key, secret_key)
+
+        with self.m_lock :
+            if key not in self.m_sessions :
+
+                # All sessions share the same loader, so that endpoints and service
+                # models are only parsed once in the process
+                core = get_botocore_session()
+                if self.m_loader is None : self.m_loader = core.get_component('data_loader')
+                else : core.register_component('data_loader', self.m_loader)
+
+                if profile is not None :
+                    session = Session(botocore_session=core, profile_name=profile)
+                elif access_key is not None and secret_key is not None :
+                    session = Session(botocore_session=core, aws_access_key_id=access_key, \
+                        aws_secret_access_key=secret_key)
+                else :
+                    session = Session(botocore_session=core)
+                self.m_sessions[key] = session
+
+            result = self.m_sessions[key]
+
+        return result
+
+    def get_client(self, profile, access_key, secret_key, region, service) :
+        """ Returns the client associated to a set of credentials, a region and a service,
+            creating it if needed
+            ---
+            profile    (str) : AWS cli profile for SSO users authentication in aws
+            access_key (str) : Access key for IAM users authentication in aws
+            secret_key (str) : Secret key associated to the previous access key
+            region     (str) : AWS region to use
+            service    (str) : AWS service to create a client for
+            ---
+            returns (Client) : Client shared by all tools using those parameters
+        """
+
+        session = self.get_session(profile, access_key, secret_key)
+        key = (profile, access_key, secret_key, region, service)
+
+        with self.m_lock :
+            if key not in self.m_clients :
+                logger.debug('Creating client for service : ' + service + \
+                    ' in region ' + str(region))
+                self.m_clients[key] = session.client(service, region_name=region, \
+                    config=self.m_config)
+            result = self.m_clients[key]
+
+        return result
+
+class RegionTable :
+    """ Class memorizing the regions in which each service is available """
+
+    # Region prefixes of the partitions other than the standard aws one
+    s_partitions = [('us-gov-', 'aws-us-gov'), ('us-isob-', 'aws-iso-b'), \
+        ('us-iso-', 'aws-iso'), ('cn-', 'aws-cn')]
+
+    def __init__(self):
+        """ Constructor """
+        self.m_lock = Lock()
+        self.m_filename = None
+        self.m_regions = {}
+
+    def configure(self, filename) :
+        """ Persist the table in a file, loading the regions it already contains
+            ---
+            filename (str) : Json file in which the table shall be stored
+        """
+
+        with self.m_lock :
+            self.m_filename = filename
+            if path.isfile(filename) :
+                with open(filename, 'r', encoding='utf-8') as file :
+                    content = load(file)
+                # Service models change with botocore, so they are only reused for the same version
+                if content.get('version') == botocore_version :
+                    for service, regions in content['regions'].items() :
+                        self.m_regions[tuple(service.split('|'))] = frozenset(regions)
+
+    def get_partition(self, region) :
+        """ Returns the partition a region belongs to
+            ---
+            region  (str) : Region to analyze
+            ---
+            returns (str) : Partition name
+        """
+
+        result = 'aws'
+
+        if region is not None :
+            for prefix, partition in self.s_partitions :
+                if region.startswith(prefix) and result == 'aws' : result = partition
+
+        return result
+
+    def get_regions(self, session, service, region) :
+        """ Returns the regions in which a service is available in a region partition
+            ---
+            session (Session)   : Session to use to compute regions if unknown
+            service (str)       : Service to analyze
+            region  (str)       : Region identifying the partition to consider
+            ---
+            returns (frozenset) : Regions in which the service is available
+        """
+
+        key = (service, self.get_partition(region))
+
+        with self.m_lock :
+            if not key in self.m_regions :
+                self.m_regions[key] = frozenset(session.get_available_regions(\
+                    service, partition_name=key[1]))
+                if self.m_filename is not None :
+                    content = {'version' : botocore_version, 'regions' : {}}
+                    for table_key, regions in self.m_regions.items() :
+                        content['regions']['|'.join(table_key)] = sorted(regions)
+                    with open(self.m_filename, 'w', encoding='utf-8') as file :
+                        dump(content, file)
+            result = self.m_regions[key]
+
+        return result
+
+# Global variable
+CLIENT_POOL = ClientPool()
+REGION_TABLE = RegionTable()
+
+class ServiceMap(dict) :
+    """ Dictionary computing the value associated to a service on its first access """
+
+    def __init__(self, services, factory):
+        """ Constructor
+            ---
+            services (list)     : List of the services the map accepts
+            factory  (function) : Function computing the value associated to a service
+        """
+        super().__init__()
+        self.m_lock = Lock()
+        self.m_services = services
+        self.m_factory = factory
+
+    def __missing__(self, service) :
+        """ Compute and store the value associated to a service not yet accessed
+            ---
+            service (str) : Service to compute value for
+        """
+
+        if not service in self.m_services : raise KeyError(service)
+
+        # Threads accessing the same service wait for the first one to compute its value
+        with self.m_lock :
+            if not dict.__contains__(self, service) :
+                self[service] = self.m_factory(service)
+            result = dict.__getitem__(self, service)
+
+        return result
+
 class Tool :
     """ Class providing tools to check AWS account compliance """
 
     # Session
     m_session = None
 
+    # Credentials used to retrieve clients
+    m_credentials = (None, None, None)
+
+    # Region used to retrieve clients
+    m_region = None
+
     # Services
     m_services = []
 
@@ -40,9 +268,13 @@ class Tool :
 
     def __init__(self):
         """ Constructor """
+        # Each instance owns its clients, so that tools initialized on different regions or
+        # accounts can be used together, including from different threads
         self.m_session = None
-        self.m_client = {}
-        self.m_is_service_active = {}
+        self.m_credentials = (None, None, None)
+        self.m_region = None
+        self.m_clients = {}
+        self.m_is_active = {}
         self.m_services = []
 
     def initialize(self, profile, access_key, secret_key, region) :
@@ -56,28 +288,174 @@ class Tool :
             region     (str) : AWS region to use
         """
 
-        # Create session
-        if profile is not None :
-            self.m_session = Session(profile_name=profile, region_name = region)
-        elif access_key is not None and secret_key is not None :
-            self.m_session = Session(aws_access_key_id=access_key, \
-                aws_secret_access_key=secret_key, region_name = region)
-        else :
-            self.m_session = Session(region_name = region)
-
-        # Create a client for each service if service is available in region
-        for service in self.m_services :
-            logger.debug(service)
-            regions = self.m_session.get_available_regions(service)
-            logger.debug(dumps(regions))
-            logger.debug(region)
-            if not region in regions and not self.m_is_global:
+        # Retrieve shared session
+        self.m_credentials = (profile, access_key, secret_key)
+        self.m_region = region
+        self.m_session = CLIENT_POOL.get_session(profile, access_key, secret_key)
+
+        # Clients and their availability are only computed when a keyword first needs them
+        self.m_is_active = ServiceMap(self.m_services, self.is_service_active)
+        self.m_clients = ServiceMap(self.m_services, self.create_client)
+
+    def is_service_active(self, service) :
+        """ Test if a service is available in the tool region
+            ---
+            service (str)  : Service to analyze
+            ---
+            returns (bool) : True if the service can be used, False otherwise
+        """
+
+        result = True
+
+        if not self.m_is_global :
+            regions = REGION_TABLE.get_regions(self.m_session, service, self.m_region)
+            if not self.m_region in regions :
                 logger.debug('Client not available for service : ' + service + \
-                    ' in region ' + region)
-                self.m_is_active[service] = False
-                self.m_clients[service] = None
-            else :
-                logger.debug('Creating client for service : ' + service + \
-                    ' in region ' + region)
-                self.m_is_active[service] = True
-                self.m_clients[service] = self.m_session.client(service)
+                    ' in region ' + str(self.m_region))
+                result = False
+
+        return result
+
+    def create_client(self, service) :
+        """ Retrieve the client associated to a service from the shared pool
+            ---
+            service (str)    : Service to retrieve client for
+            ---
+            returns (Client) : Service client, None if service is not available in region
+        """
+
+        result = None
+
+        if self.m_is_active[service] :
+            profile, access_key, secret_key = self.m_credentials
+            result = CLIENT_POOL.get_client(profile, access_key, secret_key, \
+                self.m_region, service)
+
+        return result
+
+    def get_regional_client(self, service, region) :
+        """ Retrieve from the shared pool the client associated to a service in another region,
+            with the tool credentials
+            ---
+            service (str)    : Service to retrieve client for
+            region  (str)    : Region the client shall address
+            ---
+            returns (Client) : Service client
+        """
+
+        profile, access_key, secret_key = self.m_credentials
+
+        return CLIENT_POOL.get_client(profile, access_key, secret_key, region, service)
+
+    def get_max_workers(self) :
+        """ Returns the default maximal number of concurrent calls performed by the tool
+            ---
+            returns (int) : Size of the clients connection pool
+        """
+        return CLIENT_POOL.get_max_workers()
+
+    # pylint: disable=R0913
+    @classmethod
+    def scan_regions(cls, regions, scan, profile = None, access_key = None, secret_key = None, \
+        max_workers = None) :
+        """ Run a scan concurrently in several regions, each region using its own tool, and
+            stop as soon as a region scan finds a violation
+            Profile or access_key/secret_key shall be provided
+            ---
+            regions     (list)     : Regions to scan
+            scan        (function) : Function taking the region tool as argument and returning
+                                     the list of violations found in the region
+            profile     (str)      : AWS cli profile for SSO users authentication in aws
+            access_key  (str)      : Access key for IAM users authentication in aws
+            secret_key  (str)      : Secret key associated to the previous access key
+            max_workers (int)      : Maximal number of regions scanned concurrently, clients
+                                     pool size if None
+            ---
+            returns     (dict)     : Violations found, indexed by region. Regions whose scan was
+                                     cancelled after a violation are not included
+        """
+
+        result = {}
+        regions = list(regions)
+
+        def scan_region(region) :
+            """ Scan a region with a tool of its own, so that regions do not share clients
+                ---
+                region (str) : Region to scan
+            """
+            tool = cls()
+            tool.initialize(profile, access_key, secret_key, region)
+            return scan(tool)
+
+        if max_workers is None : max_workers = CLIENT_POOL.get_max_workers()
+        workers = max(min(int(max_workers), len(regions)), 1)
+
+        with ThreadPoolExecutor(max_workers = workers) as executor :
+            futures = {executor.submit(scan_region, region) : region for region in regions}
+            pending = set(futures.keys())
+            try :
+                while len(pending) > 0 :
+                    done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                    for future in done : result[futures[future]] = future.result()
+                    if any(len(future.result()) > 0 for future in done) :
+                        # Regions not yet scanned are dropped, the ones being scanned complete
+                        for future in pending : future.cancel()
+                        pending = set()
+            except Exception :
+                for future in pending : future.cancel()
+                raise
+
+        return result
+    # pylint: enable=R0913
+
+    def wait_until(self, probe, timeout = 60, delay = 0.5, max_delay = 8) :
+        """ Poll a probe with an exponentially increasing delay until it succeeds, so that
+            changes not yet propagated in aws are waited for no longer than needed
+            ---
+            probe     (function) : Function without argument returning True once the
+                                   expected state is visible
+            timeout   (float)    : Maximal delay in seconds to wait for the probe success
+            delay     (float)    : Initial delay in seconds between two probes
+            max_delay (float)    : Maximal delay in seconds between two probes
+            ---
+            returns   (bool)     : True if the probe succeeded before the timeout, False otherwise
+        """
+
+        deadline = monotonic() + timeout
+        result = probe()
+        while not result and monotonic() < deadline :
+            sleep(min(delay, max(deadline - monotonic(), 0)))
+            delay = min(delay * 2, max_delay)
+            result = probe()
+
+        return result
+
+    def parallelize(self, function, items, max_workers = None) :
+        """ Apply a function to a list of items, performing the calls concurrently
+            ---
+            function    (function) : Function to apply to each item
+            items       (list)     : Items to process
+            max_workers (int)      : Maximal number of concurrent calls, clients pool size if None
+            ---
+            returns     (list)     : Function results, in the same order as the items
+        """
+
+        result = []
+        items = list(items)
+
+        if max_workers is None : max_workers = self.get_max_workers()
+        workers = min(int(max_workers), len(items))
+
+        if workers <= 1 :
+            for item in items : result.append(function(item))
+        else :
+            with ThreadPoolExecutor(max_workers = workers) as executor :
+                futures = [executor.submit(function, item) for item in items]
+                try :
+                    for future in futures : result.append(future.result())
+                except Exception :
+                    # The first failing item error is raised, the items not started are dropped
+                    for future in futures : future.cancel()
+                    raise
+
+        return result